@@ -1,14 +1,17 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 import logging
 import asyncio
+import orjson
 
 from config.settings import settings
 from api.routes import health, inpaint
 from api.middleware.cors import setup_cors
 from api.middleware.logging import setup_logging, LoggingMiddleware
 from utils.exceptions import InpaintException
+from utils.image_utils import start_decode_pool, shutdown_decode_pool
 
 # Setup logging
 setup_logging()
@@ -23,6 +26,35 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {settings.environment}")
     logger.info(f"Device: {settings.device}")
     
+    # Parallel image decoding across requests
+    start_decode_pool()
+    
+    # Serialize static discovery payloads once
+    app.state.root_bytes = orjson.dumps({
+        "message": "Inpaint Anything API",
+        "version": "1.0.0",
+        "docs": "/docs",
+        "health": f"{settings.api_prefix}/health"
+    })
+    app.state.info_bytes = orjson.dumps({
+        "title": "Inpaint Anything API",
+        "version": "1.0.0",
+        "environment": settings.environment,
+        "device": settings.device,
+        "models": {
+            "sam_model_type": settings.sam_model_type,
+            "sd_model_name": settings.sd_model_name
+        },
+        "endpoints": {
+            "health": f"{settings.api_prefix}/health",
+            "ready": f"{settings.api_prefix}/ready",
+            "models": f"{settings.api_prefix}/models",
+            "remove": f"{settings.api_prefix}/remove",
+            "fill": f"{settings.api_prefix}/fill", 
+            "replace": f"{settings.api_prefix}/replace"
+        }
+    })
+    
     if settings.use_mock_service:
         logger.info("Using mock service (models not loaded)")
     else:
@@ -34,6 +66,10 @@ async def lifespan(app: FastAPI):
             logger.info("Loading AI models...")
             await model_loader.load_all_models()
             logger.info("All models loaded successfully")
+            
+            # Start SD request batching on this event loop
+            from api.services.inpaint_service import inpaint_service
+            inpaint_service.start_batchers()
         except Exception as e:
             logger.error(f"Failed to load models: {str(e)}")
             if settings.environment == "production":
@@ -45,6 +81,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Inpaint API server...")
+    shutdown_decode_pool()
+    if not settings.use_mock_service:
+        from api.services.inpaint_service import inpaint_service
+        await inpaint_service.stop_batchers()
+        from api.services.executors import shutdown_executors
+        shutdown_executors()
 
 
 # Create FastAPI app
@@ -54,19 +96,30 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
 # Setup middleware
 setup_cors(app)
+# Compress large JSON bodies (base64 images); level 5 keeps encode cost low
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 app.add_middleware(LoggingMiddleware)
 
 # Exception handlers
+_HTTP_EXC_TEMPLATE = {"success": False, "message": "", "error_code": "HTTPException"}
+_INTERNAL_ERROR_BYTES = orjson.dumps({
+    "success": False,
+    "message": "Internal server error",
+    "error_code": "InternalServerError"
+})
+
+
 @app.exception_handler(InpaintException)
 async def inpaint_exception_handler(request, exc: InpaintException):
     """Handle custom inpaint exceptions"""
     logger.warning(f"Inpaint exception: {str(exc)}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=400,
         content={
             "success": False,
@@ -79,13 +132,9 @@ async def inpaint_exception_handler(request, exc: InpaintException):
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc: HTTPException):
     """Handle HTTP exceptions"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
-        content={
-            "success": False,
-            "message": exc.detail,
-            "error_code": "HTTPException"
-        }
+        content={**_HTTP_EXC_TEMPLATE, "message": exc.detail}
     )
 
 
@@ -93,13 +142,10 @@ async def http_exception_handler(request, exc: HTTPException):
 async def general_exception_handler(request, exc: Exception):
     """Handle unexpected exceptions"""
     logger.error(f"Unexpected error: {str(exc)}", exc_info=True)
-    return JSONResponse(
+    return Response(
+        _INTERNAL_ERROR_BYTES,
         status_code=500,
-        content={
-            "success": False,
-            "message": "Internal server error",
-            "error_code": "InternalServerError"
-        }
+        media_type="application/json"
     )
 
 
@@ -120,35 +166,13 @@ app.include_router(
 @app.get("/")
 async def root():
     """Root endpoint"""
-    return {
-        "message": "Inpaint Anything API",
-        "version": "1.0.0",
-        "docs": "/docs",
-        "health": f"{settings.api_prefix}/health"
-    }
+    return Response(app.state.root_bytes, media_type="application/json")
 
 
 @app.get("/info")
 async def info():
     """API information endpoint"""
-    return {
-        "title": "Inpaint Anything API",
-        "version": "1.0.0",
-        "environment": settings.environment,
-        "device": settings.device,
-        "models": {
-            "sam_model_type": settings.sam_model_type,
-            "sd_model_name": settings.sd_model_name
-        },
-        "endpoints": {
-            "health": f"{settings.api_prefix}/health",
-            "ready": f"{settings.api_prefix}/ready",
-            "models": f"{settings.api_prefix}/models",
-            "remove": f"{settings.api_prefix}/remove",
-            "fill": f"{settings.api_prefix}/fill", 
-            "replace": f"{settings.api_prefix}/replace"
-        }
-    }
+    return Response(app.state.info_bytes, media_type="application/json")
 
 
 if __name__ == "__main__":
@@ -158,6 +182,8 @@ if __name__ == "__main__":
         "api.main:app",
         host=settings.api_host,
         port=settings.api_port,
+        loop="uvloop",
+        http="httptools",
         reload=settings.debug,
         log_level="info"
     )
\ No newline at end of file
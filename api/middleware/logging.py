@@ -1,31 +1,44 @@
 import logging
 import time
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+class LoggingMiddleware:
     """Middleware for request/response logging"""
     
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("api.requests")
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Log request
-        logger = logging.getLogger("api.requests")
-        logger.info(f"Request: {request.method} {request.url}")
+        start_time = time.perf_counter()
+        method = scope["method"]
+        path = scope["path"]
+        status_code = 500
         
-        # Process request
-        response = await call_next(request)
+        # Log request
+        self.logger.info(f"Request: {method} {path}")
         
-        # Log response
-        process_time = time.time() - start_time
-        logger.info(
-            f"Response: {response.status_code} "
-            f"({process_time:.3f}s) "
-            f"{request.method} {request.url}"
-        )
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
-        return response
+        # Process request
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Log response
+            process_time = time.perf_counter() - start_time
+            self.logger.info(
+                f"Response: {status_code} "
+                f"({process_time:.3f}s) "
+                f"{method} {path}"
+            )
 
 
 def setup_logging():
@@ -1,6 +1,11 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, model_validator
 from typing import List, Optional, Union
 import re
+import numpy as np
+
+# Patterns are compiled once at import time and shared by all validators
+_B64_RE = re.compile(r'^[A-Za-z0-9+/]*={0,2}$')
+_SANITIZE_RE = re.compile(r'[<>"\']')
 
 
 class InpaintBaseRequest(BaseModel):
@@ -21,39 +26,40 @@ class InpaintBaseRequest(BaseModel):
         description="Dilate kernel size for mask processing. Default: None"
     )
 
-    @validator('point_coords')
-    def validate_point_coords(cls, v):
-        if not v:
+    @model_validator(mode="after")
+    def validate_points(self):
+        """Validate point_coords and point_labels together in one pass"""
+        if not self.point_coords:
             raise ValueError("point_coords cannot be empty")
+        if not self.point_labels:
+            raise ValueError("point_labels cannot be empty")
         
-        for i, coord in enumerate(v):
-            if len(coord) != 2:
-                raise ValueError(f"Point coordinate {i} must have exactly 2 values [x, y]")
-            
-            x, y = coord
-            if not (isinstance(x, (int, float)) and isinstance(y, (int, float))):
-                raise ValueError(f"Point coordinate {i} values must be numbers")
-            
-            if x < 0 or y < 0:
-                raise ValueError(f"Point coordinate {i} values must be non-negative")
+        try:
+            coords = np.asarray(self.point_coords, dtype=np.float64)
+        except ValueError:
+            coords = None
         
-        return v
-
-    @validator('point_labels')
-    def validate_point_labels(cls, v, values):
-        if not v:
-            raise ValueError("point_labels cannot be empty")
+        if coords is None or coords.ndim != 2 or coords.shape[1] != 2:
+            # Only walk the list on the error path to report the offending index
+            i = next((i for i, coord in enumerate(self.point_coords) if len(coord) != 2), 0)
+            raise ValueError(f"Point coordinate {i} must have exactly 2 values [x, y]")
         
-        if 'point_coords' in values:
-            coords_len = len(values['point_coords'])
-            if len(v) != coords_len:
-                raise ValueError(f"Number of labels ({len(v)}) must match number of coordinates ({coords_len})")
+        labels = np.asarray(self.point_labels, dtype=np.int64)
+        if labels.shape[0] != coords.shape[0]:
+            raise ValueError(
+                f"Number of labels ({labels.shape[0]}) must match number of coordinates ({coords.shape[0]})"
+            )
         
-        for i, label in enumerate(v):
-            if label not in [0, 1]:
-                raise ValueError(f"Point label {i} must be 0 or 1, got {label}")
+        negative = np.flatnonzero((coords < 0).any(axis=1))
+        if negative.size:
+            raise ValueError(f"Point coordinate {negative[0]} values must be non-negative")
         
-        return v
+        invalid = np.flatnonzero((labels != 0) & (labels != 1))
+        if invalid.size:
+            i = invalid[0]
+            raise ValueError(f"Point label {i} must be 0 or 1, got {self.point_labels[i]}")
+        
+        return self
 
 
 class RemoveRequest(InpaintBaseRequest):
@@ -77,7 +83,7 @@ class FillRequest(InpaintBaseRequest):
             raise ValueError("text_prompt cannot be empty or only whitespace")
         
         # Basic sanitization - remove potentially harmful patterns
-        cleaned = re.sub(r'[<>"\']', '', v.strip())
+        cleaned = _SANITIZE_RE.sub('', v.strip())
         if len(cleaned) < 1:
             raise ValueError("text_prompt must contain valid characters")
         
@@ -106,7 +112,7 @@ class ReplaceRequest(InpaintBaseRequest):
             raise ValueError("text_prompt cannot be empty or only whitespace")
         
         # Basic sanitization
-        cleaned = re.sub(r'[<>"\']', '', v.strip())
+        cleaned = _SANITIZE_RE.sub('', v.strip())
         if len(cleaned) < 1:
             raise ValueError("text_prompt must contain valid characters")
         
@@ -135,7 +141,7 @@ class ImageRequest(BaseModel):
                 v = parts[1]
             
             # Basic base64 character validation
-            if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', v):
+            if not _B64_RE.match(v):
                 raise ValueError("Invalid base64 encoding")
         
         return v
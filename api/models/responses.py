@@ -7,7 +7,7 @@ class BaseResponse(BaseModel):
     """Base response model"""
     success: bool = Field(..., description="Whether the operation was successful")
     message: str = Field(..., description="Response message")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Response timestamp")
+    timestamp: datetime = Field(..., description="Response timestamp (set once by the handler)")
 
 
 class ErrorResponse(BaseResponse):
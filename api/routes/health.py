@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
 from datetime import datetime
+import functools
 import time
 import psutil
 import logging
@@ -14,54 +16,103 @@ router = APIRouter()
 # Store startup time
 _startup_time = time.time()
 
+# Prometheus exposition template, formatted with a state snapshot per scrape
+_METRICS_TEMPLATE = "\n".join([
+    "# HELP inpaint_models_loaded Number of loaded models",
+    "# TYPE inpaint_models_loaded gauge",
+    'inpaint_models_loaded{{model="sam"}} {sam}',
+    'inpaint_models_loaded{{model="lama"}} {lama}',
+    'inpaint_models_loaded{{model="stable_diffusion"}} {stable_diffusion}',
+    "",
+    "# HELP inpaint_memory_bytes Memory usage in bytes",
+    "# TYPE inpaint_memory_bytes gauge",
+    'inpaint_memory_bytes{{type="allocated",device="{device}"}} {allocated}',
+    'inpaint_memory_bytes{{type="cached",device="{device}"}} {cached}',
+    'inpaint_memory_bytes{{type="system_total"}} {system_total}',
+    'inpaint_memory_bytes{{type="system_available"}} {system_available}',
+    "",
+    "# HELP inpaint_uptime_seconds Service uptime in seconds",
+    "# TYPE inpaint_uptime_seconds counter",
+    "inpaint_uptime_seconds {uptime}",
+    "",
+])
+
+# Prometheus text exposition format content type
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+
+@functools.lru_cache(maxsize=1)
+def _snapshot(bucket: int) -> dict:
+    """Collect model and memory state, cached per one-second bucket"""
+    if settings.use_mock_service:
+        # Mock service status
+        models_status = {
+            "sam": True,
+            "lama": True,
+            "stable_diffusion": True,
+        }
+        device = "mock"
+        memory_info = {
+            "device": "mock",
+            "allocated": 0,
+            "cached": 0,
+            "max_allocated": 0,
+        }
+        ready = True
+    else:
+        from api.services.model_loader import model_loader
+        # Check if models are loaded
+        models_status = {
+            "sam": model_loader.get_sam_predictor() is not None,
+            "lama": model_loader.get_lama_model()[0] is not None,
+            "stable_diffusion": model_loader.get_sd_pipeline() is not None,
+        }
+        device = model_loader.get_device()
+        memory_info = model_loader.get_memory_usage()
+        ready = model_loader.is_ready()
+    
+    system_memory = psutil.virtual_memory()
+    
+    return {
+        "models_loaded": models_status,
+        "device": device,
+        "memory_usage": memory_info,
+        "ready": ready,
+        "system_memory": {
+            "system_total": system_memory.total,
+            "system_available": system_memory.available,
+            "system_percent": system_memory.percent
+        },
+    }
+
+
+def get_state_snapshot() -> dict:
+    """Get the current state snapshot (refreshed at most once per second)"""
+    return _snapshot(int(time.monotonic()))
+
 
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Basic health check endpoint"""
     try:
-        if settings.use_mock_service:
-            # Mock service status
-            models_status = {
-                "sam": True,
-                "lama": True,
-                "stable_diffusion": True,
-            }
-            device = "mock"
-            memory_info = {
-                "device": "mock",
-                "allocated": 0,
-                "cached": 0,
-                "max_allocated": 0,
-            }
-        else:
-            from api.services.model_loader import model_loader
-            # Check if models are loaded
-            models_status = {
-                "sam": model_loader.get_sam_predictor() is not None,
-                "lama": model_loader.get_lama_model()[0] is not None,
-                "stable_diffusion": model_loader.get_sd_pipeline() is not None,
-            }
-            device = model_loader.get_device()
-            memory_info = model_loader.get_memory_usage()
+        snapshot = get_state_snapshot()
+        models_status = snapshot["models_loaded"]
         
-        # Add system memory info
-        system_memory = psutil.virtual_memory()
-        memory_info.update({
-            "system_total": system_memory.total,
-            "system_available": system_memory.available,
-            "system_percent": system_memory.percent
-        })
+        # Add system memory info (copy, the snapshot is shared)
+        memory_info = {**snapshot["memory_usage"], **snapshot["system_memory"]}
         
-        # Calculate uptime
-        uptime = time.time() - _startup_time
+        # Calculate uptime (one clock read shared with the timestamp)
+        now = time.time()
+        uptime = now - _startup_time
         
         status = "healthy" if all(models_status.values()) else "partial"
         
         return HealthResponse(
             message="Service is running",
+            timestamp=datetime.utcfromtimestamp(now),
             status=status,
             models_loaded=models_status,
-            device=device,
+            device=snapshot["device"],
             memory_usage=memory_info,
             uptime=uptime
         )
@@ -75,37 +126,22 @@ async def health_check():
 async def readiness_check():
     """Readiness check - returns 200 only if all models are loaded"""
     try:
-        if settings.use_mock_service:
-            models_status = {
-                "sam": True,
-                "lama": True,
-                "stable_diffusion": True,
-            }
-            device = "mock"
-            memory_info = {"device": "mock", "allocated": 0, "cached": 0}
-        else:
-            from api.services.model_loader import model_loader
-            if not model_loader.is_ready():
-                raise HTTPException(
-                    status_code=503, 
-                    detail="Service not ready - models still loading"
-                )
-            
-            models_status = {
-                "sam": True,
-                "lama": True,
-                "stable_diffusion": True,
-            }
-            device = model_loader.get_device()
-            memory_info = model_loader.get_memory_usage()
+        snapshot = get_state_snapshot()
+        if not snapshot["ready"]:
+            raise HTTPException(
+                status_code=503, 
+                detail="Service not ready - models still loading"
+            )
         
+        now = time.time()
         return HealthResponse(
             message="Service is ready",
+            timestamp=datetime.utcfromtimestamp(now),
             status="ready",
-            models_loaded=models_status,
-            device=device,
-            memory_usage=memory_info,
-            uptime=time.time() - _startup_time
+            models_loaded=snapshot["models_loaded"],
+            device=snapshot["device"],
+            memory_usage=dict(snapshot["memory_usage"]),
+            uptime=now - _startup_time
         )
         
     except HTTPException:
@@ -169,6 +205,7 @@ async def model_status():
         
         return ModelStatusResponse(
             message="Model status retrieved",
+            timestamp=datetime.utcnow(),
             models=models_info
         )
         
@@ -177,33 +214,28 @@ async def model_status():
         raise HTTPException(status_code=500, detail="Model status check failed")
 
 
-@router.get("/metrics")
+@router.get("/metrics", response_class=PlainTextResponse)
 async def metrics():
     """Prometheus-style metrics endpoint"""
     try:
-        memory_info = model_loader.get_memory_usage()
-        system_memory = psutil.virtual_memory()
+        snapshot = get_state_snapshot()
+        models_status = snapshot["models_loaded"]
+        memory_info = snapshot["memory_usage"]
+        system_memory = snapshot["system_memory"]
         
-        metrics = [
-            f"# HELP inpaint_models_loaded Number of loaded models",
-            f"# TYPE inpaint_models_loaded gauge",
-            f"inpaint_models_loaded{{model=\"sam\"}} {1 if model_loader.get_sam_predictor() else 0}",
-            f"inpaint_models_loaded{{model=\"lama\"}} {1 if model_loader.get_lama_model()[0] else 0}",
-            f"inpaint_models_loaded{{model=\"stable_diffusion\"}} {1 if model_loader.get_sd_pipeline() else 0}",
-            "",
-            f"# HELP inpaint_memory_bytes Memory usage in bytes",
-            f"# TYPE inpaint_memory_bytes gauge",
-            f"inpaint_memory_bytes{{type=\"allocated\",device=\"{memory_info['device']}\"}} {memory_info['allocated']}",
-            f"inpaint_memory_bytes{{type=\"cached\",device=\"{memory_info['device']}\"}} {memory_info['cached']}",
-            f"inpaint_memory_bytes{{type=\"system_total\"}} {system_memory.total}",
-            f"inpaint_memory_bytes{{type=\"system_available\"}} {system_memory.available}",
-            "",
-            f"# HELP inpaint_uptime_seconds Service uptime in seconds",
-            f"# TYPE inpaint_uptime_seconds counter",
-            f"inpaint_uptime_seconds {time.time() - _startup_time}",
-        ]
+        metrics = _METRICS_TEMPLATE.format(
+            sam=int(models_status["sam"]),
+            lama=int(models_status["lama"]),
+            stable_diffusion=int(models_status["stable_diffusion"]),
+            device=memory_info["device"],
+            allocated=memory_info["allocated"],
+            cached=memory_info["cached"],
+            system_total=system_memory["system_total"],
+            system_available=system_memory["system_available"],
+            uptime=time.time() - _startup_time,
+        )
         
-        return "\n".join(metrics)
+        return PlainTextResponse(metrics.encode("utf-8"), media_type=METRICS_MEDIA_TYPE)
         
     except Exception as e:
         logger.error(f"Metrics endpoint failed: {str(e)}")
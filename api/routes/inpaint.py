@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Depends, Request
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import TypeAdapter
+import orjson
 import time
 import logging
-from typing import Optional
-import json
+from datetime import datetime
+from typing import Optional, Union
 
 from api.models.requests import (
     RemoveRequest, FillRequest, ReplaceRequest,
@@ -17,7 +19,8 @@ if settings.use_mock_service:
 else:
     from api.services.inpaint_service import inpaint_service
 from utils.image_utils import (
-    decode_base64_image, encode_image_to_base64, load_image_from_file
+    decode_base64_image, encode_image_to_base64, encode_mask_to_base64,
+    load_image_from_file
 )
 from utils.exceptions import (
     InpaintException, ModelNotLoadedException, InvalidImageException,
@@ -27,10 +30,49 @@ from utils.exceptions import (
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Read uploads 1MB at a time
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Allowance for multipart boundaries and the JSON form field in Content-Length
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Validators for the form-data request path, built once at import
+_ADAPTERS = {
+    RemoveRequest: TypeAdapter(RemoveRequest),
+    FillRequest: TypeAdapter(FillRequest),
+    ReplaceRequest: TypeAdapter(ReplaceRequest),
+}
+
+
+# Static /test body, serialized once
+_TEST_BYTES = orjson.dumps({"message": "Inpaint API is working"})
+
+
+def _parse(cls, raw: Union[str, bytes]):
+    """Parse and validate a raw JSON form field with the cached adapter"""
+    return _ADAPTERS[cls].validate_json(raw)
+
+
+def _check_upload_size(http_request: Optional[Request], image: UploadFile):
+    """Reject oversize uploads from the declared sizes before reading any bytes"""
+    limit = settings.max_file_size
+    
+    if http_request is not None:
+        try:
+            content_length = int(http_request.headers.get("content-length", "0"))
+        except ValueError:
+            content_length = 0
+        if content_length > limit + FORM_OVERHEAD_BYTES:
+            raise FileTooLargeException(f"Request size {content_length} exceeds limit {limit}")
+    
+    if image.size is not None and image.size > limit:
+        raise FileTooLargeException(f"File size {image.size} exceeds limit {limit}")
+
 
 async def get_image_from_request(
     image: Optional[UploadFile] = File(None),
-    image_data: Optional[str] = None
+    image_data: Optional[str] = None,
+    http_request: Optional[Request] = None
 ):
     """Helper to get image from either file upload or base64 data"""
     if image is not None:
@@ -38,7 +80,16 @@ async def get_image_from_request(
         if image.content_type not in ["image/jpeg", "image/png", "image/webp"]:
             raise InvalidImageException(f"Unsupported image type: {image.content_type}")
         
-        contents = await image.read()
+        _check_upload_size(http_request, image)
+        
+        # Read the upload in chunks into a single buffer, rejecting oversize files early
+        contents = bytearray()
+        while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+            contents.extend(chunk)
+            if len(contents) > settings.max_file_size:
+                raise FileTooLargeException(
+                    f"File size exceeds limit {settings.max_file_size}"
+                )
         return await load_image_from_file(contents)
     
     elif image_data is not None:
@@ -51,6 +102,7 @@ async def get_image_from_request(
 
 @router.post("/remove", response_model=InpaintResponse)
 async def remove_object(
+    http_request: Request,
     image: Optional[UploadFile] = File(None),
     request: Optional[str] = Form(None),
     # Alternative: accept JSON body
@@ -70,9 +122,9 @@ async def remove_object(
             if request is None:
                 raise InvalidImageException("Request data is required")
             
-            req_dict = json.loads(request)
-            req_data = RemoveRequest(**req_dict)
-            img_array = await get_image_from_request(image=image)
+            # Parse and validate the raw JSON string in one pass
+            req_data = _parse(RemoveRequest, request)
+            img_array = await get_image_from_request(image=image, http_request=http_request)
         
         # Process image
         result_image, mask = await inpaint_service.remove_object(
@@ -84,21 +136,25 @@ async def remove_object(
         
         # Encode results
         result_b64 = await encode_image_to_base64(result_image)
-        mask_b64 = await encode_image_to_base64((mask * 255).astype('uint8'))
+        mask_b64 = await encode_mask_to_base64(mask)
         
-        processing_time = time.time() - start_time
+        end_time = time.time()
+        processing_time = end_time - start_time
         
-        return InpaintResponse(
-            message="Object removed successfully",
-            result_image=result_b64,
-            mask_image=mask_b64,
-            processing_time=processing_time,
-            metadata={
+        # Serialize directly; the body is already validated and holds large base64 strings
+        return ORJSONResponse({
+            "success": True,
+            "message": "Object removed successfully",
+            "timestamp": datetime.utcfromtimestamp(end_time),
+            "result_image": result_b64,
+            "mask_image": mask_b64,
+            "processing_time": processing_time,
+            "metadata": {
                 "point_coords": req_data.point_coords,
                 "point_labels": req_data.point_labels,
                 "dilate_kernel_size": req_data.dilate_kernel_size
             }
-        )
+        })
         
     except InpaintException as e:
         logger.warning(f"Inpaint exception in remove_object: {str(e)}")
@@ -110,6 +166,7 @@ async def remove_object(
 
 @router.post("/fill", response_model=InpaintResponse)
 async def fill_object(
+    http_request: Request,
     image: Optional[UploadFile] = File(None),
     request: Optional[str] = Form(None),
     # Alternative: accept JSON body
@@ -129,9 +186,9 @@ async def fill_object(
             if request is None:
                 raise InvalidImageException("Request data is required")
             
-            req_dict = json.loads(request)
-            req_data = FillRequest(**req_dict)
-            img_array = await get_image_from_request(image=image)
+            # Parse and validate the raw JSON string in one pass
+            req_data = _parse(FillRequest, request)
+            img_array = await get_image_from_request(image=image, http_request=http_request)
         
         # Process image
         result_image, mask = await inpaint_service.fill_object(
@@ -144,22 +201,26 @@ async def fill_object(
         
         # Encode results
         result_b64 = await encode_image_to_base64(result_image)
-        mask_b64 = await encode_image_to_base64((mask * 255).astype('uint8'))
+        mask_b64 = await encode_mask_to_base64(mask)
         
-        processing_time = time.time() - start_time
+        end_time = time.time()
+        processing_time = end_time - start_time
         
-        return InpaintResponse(
-            message="Object filled successfully",
-            result_image=result_b64,
-            mask_image=mask_b64,
-            processing_time=processing_time,
-            metadata={
+        # Serialize directly; the body is already validated and holds large base64 strings
+        return ORJSONResponse({
+            "success": True,
+            "message": "Object filled successfully",
+            "timestamp": datetime.utcfromtimestamp(end_time),
+            "result_image": result_b64,
+            "mask_image": mask_b64,
+            "processing_time": processing_time,
+            "metadata": {
                 "point_coords": req_data.point_coords,
                 "point_labels": req_data.point_labels,
                 "text_prompt": req_data.text_prompt,
                 "dilate_kernel_size": req_data.dilate_kernel_size
             }
-        )
+        })
         
     except InpaintException as e:
         logger.warning(f"Inpaint exception in fill_object: {str(e)}")
@@ -171,6 +232,7 @@ async def fill_object(
 
 @router.post("/replace", response_model=InpaintResponse)
 async def replace_object(
+    http_request: Request,
     image: Optional[UploadFile] = File(None),
     request: Optional[str] = Form(None),
     # Alternative: accept JSON body
@@ -190,9 +252,9 @@ async def replace_object(
             if request is None:
                 raise InvalidImageException("Request data is required")
             
-            req_dict = json.loads(request)
-            req_data = ReplaceRequest(**req_dict)
-            img_array = await get_image_from_request(image=image)
+            # Parse and validate the raw JSON string in one pass
+            req_data = _parse(ReplaceRequest, request)
+            img_array = await get_image_from_request(image=image, http_request=http_request)
         
         # Process image
         result_image, mask = await inpaint_service.replace_background(
@@ -206,23 +268,27 @@ async def replace_object(
         
         # Encode results
         result_b64 = await encode_image_to_base64(result_image)
-        mask_b64 = await encode_image_to_base64((mask * 255).astype('uint8'))
+        mask_b64 = await encode_mask_to_base64(mask)
         
-        processing_time = time.time() - start_time
+        end_time = time.time()
+        processing_time = end_time - start_time
         
-        return InpaintResponse(
-            message="Object replaced successfully",
-            result_image=result_b64,
-            mask_image=mask_b64,
-            processing_time=processing_time,
-            metadata={
+        # Serialize directly; the body is already validated and holds large base64 strings
+        return ORJSONResponse({
+            "success": True,
+            "message": "Object replaced successfully",
+            "timestamp": datetime.utcfromtimestamp(end_time),
+            "result_image": result_b64,
+            "mask_image": mask_b64,
+            "processing_time": processing_time,
+            "metadata": {
                 "point_coords": req_data.point_coords,
                 "point_labels": req_data.point_labels,
                 "text_prompt": req_data.text_prompt,
                 "dilate_kernel_size": req_data.dilate_kernel_size,
                 "num_inference_steps": req_data.num_inference_steps
             }
-        )
+        })
         
     except InpaintException as e:
         logger.warning(f"Inpaint exception in replace_object: {str(e)}")
@@ -235,4 +301,4 @@ async def replace_object(
 @router.get("/test")
 async def test_endpoint():
     """Simple test endpoint"""
-    return {"message": "Inpaint API is working", "timestamp": time.time()}
\ No newline at end of file
+    return Response(_TEST_BYTES, media_type="application/json")
\ No newline at end of file
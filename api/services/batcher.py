@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBatcher:
+    """Collect concurrent requests into batches for a single model call"""
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 4,
+        max_wait: float = 0.01,
+        name: str = "batcher",
+        executor: Optional[Executor] = None
+    ):
+        # process_batch is synchronous and runs in executor (default executor if None)
+        self.process_batch = process_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self.queue: Optional[asyncio.Queue] = None
+        self.inflight = 0
+        self._worker: Optional[asyncio.Task] = None
+        # Batch currently being collected or processed, so stop() can fail its futures
+        self._batch: List[Tuple[Any, asyncio.Future]] = []
+
+    def start(self):
+        """Start the background worker on the running event loop"""
+        if self._worker is None:
+            self.queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Started {self.name} (max_batch_size={self.max_batch_size})")
+
+    async def stop(self):
+        """Cancel the background worker and fail every request it still holds"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+            pending = self._batch
+            self._batch = []
+            while not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(RuntimeError(f"{self.name} stopped"))
+
+    async def submit(self, payload: Any) -> Any:
+        """Queue a payload and wait for its result"""
+        if self._worker is None:
+            self.start()
+
+        loop = asyncio.get_running_loop()
+
+        if self.queue.empty() and self.inflight == 0:
+            # Nothing to batch with: skip the queue and the collection window
+            self.inflight += 1
+            try:
+                results = await loop.run_in_executor(self.executor, self.process_batch, [payload])
+            finally:
+                self.inflight -= 1
+            return results[0]
+
+        future = loop.create_future()
+        await self.queue.put((payload, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        """Wait for one item, then gather more until the batch is full or max_wait passes"""
+        loop = asyncio.get_running_loop()
+        items = self._batch = []
+        items.append(await self.queue.get())
+        # Count dequeued items as in flight right away, so submit() doesn't take the
+        # unbatched fast path while this batch is still collecting
+        self.inflight += 1
+        deadline = loop.time() + self.max_wait
+
+        while len(items) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                self.inflight += 1
+            except asyncio.TimeoutError:
+                break
+
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                items = await self._collect()
+                payloads = [payload for payload, _ in items]
+                logger.info(f"{self.name}: processing batch of {len(items)}")
+                results = await loop.run_in_executor(self.executor, self.process_batch, payloads)
+            except Exception as e:
+                logger.error(f"{self.name}: batch failed: {str(e)}")
+                for _, future in self._batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(items, results):
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                # Also runs when cancelled mid-collection, so dequeued items are released
+                self.inflight -= len(self._batch)
@@ -0,0 +1,40 @@
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from config.settings import settings
+
+# One thread per GPU model, so each model always runs on the same thread and
+# CUDA stream; a separate pool handles CPU-side pre/post-processing
+sam_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sam")
+lama_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lama")
+sd_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sd")
+cpu_executor = ThreadPoolExecutor(thread_name_prefix="cpu")
+
+_thread_local = threading.local()
+
+
+def model_stream():
+    """Run CUDA work on the calling executor thread's own stream"""
+    if settings.device != "cuda":
+        return contextlib.nullcontext()
+
+    stream = getattr(_thread_local, "stream", None)
+    if stream is None:
+        stream = _thread_local.stream = torch.cuda.Stream()
+    return torch.cuda.stream(stream)
+
+
+def sam_autocast():
+    """bf16 autocast for the SAM image encoder on GPUs that support it"""
+    if settings.device == "cuda" and settings.sam_bf16 and torch.cuda.is_bf16_supported():
+        return torch.autocast(device_type="cuda", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def shutdown_executors():
+    """Shut down all model and CPU executors"""
+    for executor in (sam_executor, lama_executor, sd_executor, cpu_executor):
+        executor.shutdown(wait=False)
@@ -1,11 +1,18 @@
 import asyncio
+import hashlib
+from collections import OrderedDict
 import numpy as np
 import torch
+import torch.nn.functional as F
 from typing import List, Tuple, Optional
 import logging
 from PIL import Image
 
 from api.services.model_loader import model_loader
+from api.services.batcher import AsyncBatcher
+from api.services.executors import (
+    sam_executor, lama_executor, sd_executor, model_stream, sam_autocast
+)
 from utils.exceptions import ModelNotLoadedException, ProcessingTimeoutException, InvalidImageException
 from utils.image_utils import validate_coordinates, validate_point_labels
 from utils import dilate_mask
@@ -14,14 +21,60 @@ from config.settings import settings
 # Import existing functions
 from sam_segment import predict_masks_with_sam
 from lama_inpaint import inpaint_img_with_lama, inpaint_img_with_builded_lama
-from stable_diffusion_inpaint import fill_img_with_sd, replace_img_with_sd
+from stable_diffusion_inpaint import fill_img_with_sd_batch, replace_img_with_sd_batch
 
 logger = logging.getLogger(__name__)
 
+try:
+    import xxhash
+
+    def _hash_bytes(data) -> int:
+        return xxhash.xxh3_64_intdigest(data)
+except ImportError:  # Fall back to hashlib when xxhash is not installed
+    def _hash_bytes(data) -> bytes:
+        return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def _image_key(image: np.ndarray) -> tuple:
+    """Cheap fingerprint of an image array for the SAM embedding cache"""
+    return image.shape, image.dtype.str, _hash_bytes(np.ascontiguousarray(image))
+
 
 class InpaintService:
     def __init__(self):
         self.model_loader = model_loader
+        
+        # LRU of SAM image embeddings keyed by image fingerprint
+        self._embed_cache: OrderedDict = OrderedDict()
+        
+        # SamPredictor holds the current embedding as instance state
+        self._sam_lock = asyncio.Lock()
+        
+        # Concurrent SD requests are grouped into one pipeline call
+        self.fill_batcher = AsyncBatcher(
+            self._fill_with_sd_batch_sync,
+            max_batch_size=settings.sd_max_batch_size,
+            max_wait=settings.sd_batch_wait_ms / 1000,
+            name="sd_fill_batcher",
+            executor=sd_executor
+        )
+        self.replace_batcher = AsyncBatcher(
+            self._replace_with_sd_batch_sync,
+            max_batch_size=settings.sd_max_batch_size,
+            max_wait=settings.sd_batch_wait_ms / 1000,
+            name="sd_replace_batcher",
+            executor=sd_executor
+        )
+
+    def start_batchers(self):
+        """Start the SD batching workers (call from the running event loop)"""
+        self.fill_batcher.start()
+        self.replace_batcher.start()
+
+    async def stop_batchers(self):
+        """Stop the SD batching workers"""
+        await self.fill_batcher.stop()
+        await self.replace_batcher.stop()
 
     async def remove_object(
         self,
@@ -32,9 +85,12 @@ class InpaintService:
     ) -> Tuple[np.ndarray, np.ndarray]:
         """Remove object from image using SAM + LaMa"""
         try:
+            # C-contiguous uint8 up front, so hashing and torch.from_numpy don't copy
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            
             # Validate inputs
             point_coords = validate_coordinates(point_coords, image.shape)
-            point_labels = validate_point_labels(point_labels, len(point_coords))
+            point_labels = validate_point_labels(point_labels, point_coords.shape[0])
             
             # Get models
             sam_predictor = self.model_loader.get_sam_predictor()
@@ -45,23 +101,28 @@ class InpaintService:
             if lama_model is None:
                 raise ModelNotLoadedException("LaMa model not loaded")
             
-            # Generate mask with SAM
-            logger.info("Generating mask with SAM")
-            masks, scores, logits = await self._predict_masks_async(
-                image, point_coords, point_labels, sam_predictor
-            )
-            
-            # Select best mask (highest score)
-            mask = masks[np.argmax(scores)]
+            # The LaMa image upload doesn't depend on SAM, so start it on the
+            # LaMa stream now and let it overlap with mask prediction
+            loop = asyncio.get_running_loop()
+            image_upload = loop.run_in_executor(lama_executor, self._upload_image_sync, image)
             
-            # Dilate mask if specified
-            if dilate_kernel_size:
-                mask = dilate_mask(mask, dilate_kernel_size)
+            # Generate the best-scoring mask with SAM (dilated if specified)
+            logger.info("Generating mask with SAM")
+            try:
+                mask = await self._predict_masks_async(
+                    image, point_coords, point_labels, sam_predictor, dilate_kernel_size
+                )
+            except BaseException:
+                # Don't leave the upload running unobserved: cancel it if it hasn't
+                # started, otherwise wait for it and discard its result
+                if not image_upload.cancel():
+                    await asyncio.gather(image_upload, return_exceptions=True)
+                raise
             
             # Inpaint with LaMa
             logger.info("Inpainting with LaMa")
             inpainted_image = await self._inpaint_with_lama_async(
-                image, mask, lama_model, lama_config
+                image, mask, lama_model, lama_config, img_tensor=await image_upload
             )
             
             return inpainted_image, mask
@@ -80,9 +141,12 @@ class InpaintService:
     ) -> Tuple[np.ndarray, np.ndarray]:
         """Fill object region with Stable Diffusion"""
         try:
+            # C-contiguous uint8 up front, so hashing and torch.from_numpy don't copy
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            
             # Validate inputs
             point_coords = validate_coordinates(point_coords, image.shape)
-            point_labels = validate_point_labels(point_labels, len(point_coords))
+            point_labels = validate_point_labels(point_labels, point_coords.shape[0])
             
             if not text_prompt.strip():
                 raise InvalidImageException("Text prompt cannot be empty")
@@ -96,19 +160,12 @@ class InpaintService:
             if sd_pipeline is None:
                 raise ModelNotLoadedException("Stable Diffusion model not loaded")
             
-            # Generate mask with SAM
+            # Generate the best-scoring mask with SAM (dilated if specified)
             logger.info("Generating mask with SAM")
-            masks, scores, logits = await self._predict_masks_async(
-                image, point_coords, point_labels, sam_predictor
+            mask = await self._predict_masks_async(
+                image, point_coords, point_labels, sam_predictor, dilate_kernel_size
             )
             
-            # Select best mask
-            mask = masks[np.argmax(scores)]
-            
-            # Dilate mask if specified
-            if dilate_kernel_size:
-                mask = dilate_mask(mask, dilate_kernel_size)
-            
             # Fill with Stable Diffusion
             logger.info("Filling with Stable Diffusion")
             filled_image = await self._fill_with_sd_async(
@@ -132,9 +189,12 @@ class InpaintService:
     ) -> Tuple[np.ndarray, np.ndarray]:
         """Replace background using Stable Diffusion"""
         try:
+            # C-contiguous uint8 up front, so hashing and torch.from_numpy don't copy
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            
             # Validate inputs
             point_coords = validate_coordinates(point_coords, image.shape)
-            point_labels = validate_point_labels(point_labels, len(point_coords))
+            point_labels = validate_point_labels(point_labels, point_coords.shape[0])
             
             if not text_prompt.strip():
                 raise InvalidImageException("Text prompt cannot be empty")
@@ -148,19 +208,12 @@ class InpaintService:
             if sd_pipeline is None:
                 raise ModelNotLoadedException("Stable Diffusion model not loaded")
             
-            # Generate mask with SAM
+            # Generate the best-scoring mask with SAM (dilated if specified)
             logger.info("Generating mask with SAM")
-            masks, scores, logits = await self._predict_masks_async(
-                image, point_coords, point_labels, sam_predictor
+            mask = await self._predict_masks_async(
+                image, point_coords, point_labels, sam_predictor, dilate_kernel_size
             )
             
-            # Select best mask
-            mask = masks[np.argmax(scores)]
-            
-            # Dilate mask if specified
-            if dilate_kernel_size:
-                mask = dilate_mask(mask, dilate_kernel_size)
-            
             # Replace with Stable Diffusion
             logger.info("Replacing with Stable Diffusion")
             replaced_image = await self._replace_with_sd_async(
@@ -176,63 +229,146 @@ class InpaintService:
     async def _predict_masks_async(
         self,
         image: np.ndarray,
-        point_coords: List[List[float]],
-        point_labels: List[int],
-        sam_predictor
-    ):
-        """Predict masks asynchronously"""
+        point_coords: np.ndarray,
+        point_labels: np.ndarray,
+        sam_predictor,
+        dilate_kernel_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Predict the best mask asynchronously"""
         loop = asyncio.get_event_loop()
         
-        # Set image (this needs to be done in main thread)
-        sam_predictor.set_image(image)
-        
-        # Run prediction in executor
-        result = await loop.run_in_executor(
-            None,
-            self._predict_masks_sync,
-            sam_predictor,
-            np.array(point_coords),
-            np.array(point_labels)
-        )
+        async with self._sam_lock:
+            # Encode and predict on the SAM thread, keeping the event loop free
+            result = await loop.run_in_executor(
+                sam_executor,
+                self._sam_encode_and_predict_sync,
+                sam_predictor,
+                image,
+                point_coords,
+                point_labels,
+                dilate_kernel_size
+            )
         
         return result
 
-    def _predict_masks_sync(self, sam_predictor, point_coords, point_labels):
-        """Synchronous mask prediction"""
-        masks, scores, logits = sam_predictor.predict(
-            point_coords=point_coords,
-            point_labels=point_labels,
-            multimask_output=True,
+    def _set_image_cached(self, sam_predictor, image: np.ndarray):
+        """Restore a cached SAM embedding for this image, or compute and cache it
+        
+        The predictor keeps the embedding as instance state and is not
+        thread-safe, so callers must serialize access to it.
+        """
+        key = _image_key(image)
+        cached = self._embed_cache.get(key)
+        
+        if cached is not None:
+            self._embed_cache.move_to_end(key)
+            features, original_size, input_size = cached
+            sam_predictor.features = features
+            sam_predictor.original_size = original_size
+            sam_predictor.input_size = input_size
+            sam_predictor.is_image_set = True
+            return
+        
+        with sam_autocast():
+            sam_predictor.set_image(image)
+        # The mask decoder runs in fp32, so keep the embedding fp32 too
+        sam_predictor.features = sam_predictor.features.float()
+        self._embed_cache[key] = (
+            sam_predictor.features.detach(),
+            sam_predictor.original_size,
+            sam_predictor.input_size,
         )
-        return masks, scores, logits
+        if len(self._embed_cache) > settings.sam_embedding_cache_size:
+            self._embed_cache.popitem(last=False)
+
+    def _sam_encode_and_predict_sync(
+        self, sam_predictor, image, point_coords, point_labels, dilate_kernel_size=None
+    ):
+        """Synchronous image encoding and mask prediction
+        
+        Picks the best of the multimask outputs (and dilates it) on the device,
+        so only one mask is copied back to the host.
+        """
+        with model_stream(), torch.inference_mode():
+            self._set_image_cached(sam_predictor, image)
+            
+            coords = sam_predictor.transform.apply_coords(point_coords, sam_predictor.original_size)
+            coords_t = torch.as_tensor(coords, dtype=torch.float, device=sam_predictor.device)
+            labels_t = torch.as_tensor(point_labels, dtype=torch.int, device=sam_predictor.device)
+            masks, scores, _ = sam_predictor.predict_torch(
+                coords_t[None], labels_t[None], multimask_output=True
+            )
+            mask = masks[0, torch.argmax(scores[0])]
+            
+            if dilate_kernel_size and settings.device != "cpu":
+                return self._dilate_mask_gpu(mask, dilate_kernel_size).cpu().numpy()
+            mask = mask.cpu().numpy()
+        
+        if dilate_kernel_size:
+            mask = dilate_mask(mask, dilate_kernel_size)
+        return mask
 
     async def _inpaint_with_lama_async(
         self,
         image: np.ndarray,
         mask: np.ndarray,
         lama_model,
-        lama_config
+        lama_config,
+        img_tensor: Optional[torch.Tensor] = None
     ):
         """Inpaint with LaMa asynchronously"""
         loop = asyncio.get_event_loop()
         
         result = await loop.run_in_executor(
-            None,
+            lama_executor,
             self._inpaint_with_lama_sync,
             image,
             mask,
             lama_model,
-            lama_config
+            lama_config,
+            img_tensor
         )
         
         return result
 
-    def _inpaint_with_lama_sync(self, image, mask, lama_model, lama_config):
+    def _inpaint_with_lama_sync(self, image, mask, lama_model, lama_config, img_tensor=None):
         """Synchronous LaMa inpainting"""
+        if img_tensor is None:
+            img_tensor = self._prepare_image(image)
+        
         # Use the built model instead of loading each time
-        return inpaint_img_with_builded_lama(
-            lama_model, lama_config, image, mask, device=settings.device
-        )
+        with model_stream(), torch.inference_mode():
+            return inpaint_img_with_builded_lama(
+                lama_model, image, mask,
+                device=settings.device,
+                img_tensor=img_tensor
+            )
+
+    def _upload_image_sync(self, image: np.ndarray) -> torch.Tensor:
+        """Copy image to the device on the calling thread's stream without blocking"""
+        with model_stream():
+            return self._prepare_image(image).to(settings.device, non_blocking=True)
+
+    @staticmethod
+    def _prepare_image(image: np.ndarray) -> torch.Tensor:
+        """Zero-copy view of a contiguous uint8 image, pinned on CUDA for an async H2D copy"""
+        tensor = torch.from_numpy(image)
+        if settings.device == "cuda":
+            tensor = tensor.pin_memory()
+        return tensor
+
+    @staticmethod
+    def _dilate_mask_gpu(mask: torch.Tensor, k: int) -> torch.Tensor:
+        """Binary dilation with a k x k square as one max_pool2d; matches dilate_mask (uint8 0/1)"""
+        mask = (mask > 0).to(torch.float16)[None, None]
+        # Same anchor as cv2.dilate for odd and even k
+        mask = F.pad(mask, (k // 2, (k - 1) // 2, k // 2, (k - 1) // 2))
+        return F.max_pool2d(mask, kernel_size=k, stride=1)[0, 0].to(torch.uint8)
+
+    @staticmethod
+    def _to_sd_mask(mask: np.ndarray) -> np.ndarray:
+        """SD helpers expect 0/255 uint8 masks"""
+        return (mask > 0).astype(np.uint8) * 255
 
     async def _fill_with_sd_async(
         self,
@@ -241,19 +377,19 @@ class InpaintService:
         text_prompt: str,
         sd_pipeline
     ):
-        """Fill with Stable Diffusion asynchronously"""
-        loop = asyncio.get_event_loop()
-        
-        result = await loop.run_in_executor(
-            None,
-            fill_img_with_sd,
-            image,
-            mask,
-            text_prompt,
-            settings.device
+        """Fill with Stable Diffusion asynchronously (batched)"""
+        return await self.fill_batcher.submit(
+            (image, self._to_sd_mask(mask), text_prompt)
         )
-        
-        return result
+
+    def _fill_with_sd_batch_sync(self, payloads):
+        """Synchronous batched SD filling"""
+        images, masks, text_prompts = zip(*payloads)
+        with model_stream(), torch.inference_mode():
+            return fill_img_with_sd_batch(
+                self.model_loader.get_sd_pipeline(),
+                list(images), list(masks), list(text_prompts)
+            )
 
     async def _replace_with_sd_async(
         self,
@@ -263,20 +399,34 @@ class InpaintService:
         sd_pipeline,
         num_inference_steps: int
     ):
-        """Replace with Stable Diffusion asynchronously"""
-        loop = asyncio.get_event_loop()
-        
-        result = await loop.run_in_executor(
-            None,
-            replace_img_with_sd,
-            image,
-            mask,
-            text_prompt,
-            num_inference_steps,
-            settings.device
+        """Replace with Stable Diffusion asynchronously (batched)"""
+        return await self.replace_batcher.submit(
+            (image, self._to_sd_mask(mask), text_prompt, num_inference_steps)
         )
+
+    def _replace_with_sd_batch_sync(self, payloads):
+        """Synchronous batched SD replacement"""
+        sd_pipeline = self.model_loader.get_sd_pipeline()
+        results = [None] * len(payloads)
         
-        return result
+        # One pipeline call runs a single step count, so group by it
+        groups = {}
+        for i, payload in enumerate(payloads):
+            groups.setdefault(payload[3], []).append(i)
+        
+        with model_stream(), torch.inference_mode():
+            for num_inference_steps, indices in groups.items():
+                outputs = replace_img_with_sd_batch(
+                    sd_pipeline,
+                    [payloads[i][0] for i in indices],
+                    [payloads[i][1] for i in indices],
+                    [payloads[i][2] for i in indices],
+                    step=num_inference_steps
+                )
+                for i, output in zip(indices, outputs):
+                    results[i] = output
+        
+        return results
 
 
 # Global service instance
@@ -4,6 +4,7 @@ from typing import List, Tuple, Optional
 import logging
 from PIL import Image
 import io
+import re
 import base64
 
 from utils.image_utils import validate_coordinates, validate_point_labels
@@ -11,6 +12,19 @@ from utils.exceptions import InvalidImageException
 
 logger = logging.getLogger(__name__)
 
+# Prompt keyword -> fill color, in priority order
+_PROMPT_COLORS = {
+    "red": [255, 0, 0],
+    "blue": [0, 0, 255],
+    "green": [0, 255, 0],
+    "flower": [255, 192, 203],  # Pink
+    "sky": [135, 206, 235],  # Sky blue
+}
+_DEFAULT_COLOR = [128, 128, 128]  # Gray
+_PROMPT_PRIORITY = {keyword: rank for rank, keyword in enumerate(_PROMPT_COLORS)}
+# Zero-width lookahead matches at every position, so overlapping keywords are all found
+_PROMPT_COLOR_RE = re.compile(f"(?=({'|'.join(_PROMPT_COLORS)}))")
+
 
 class MockInpaintService:
     """Mock service for testing API without actual models"""
@@ -25,23 +39,23 @@ class MockInpaintService:
         point_labels: List[int],
         dilate_kernel_size: Optional[int] = None
     ) -> Tuple[np.ndarray, np.ndarray]:
-        """Mock object removal - returns image with red rectangle removed"""
+        """Mock object removal - returns image with red rectangle removed (edits image in place)"""
         try:
             # Validate inputs
             point_coords = validate_coordinates(point_coords, image.shape)
-            point_labels = validate_point_labels(point_labels, len(point_coords))
+            point_labels = validate_point_labels(point_labels, point_coords.shape[0])
             
-            logger.info(f"Mock remove_object: {len(point_coords)} points")
+            logger.info(f"Mock remove_object: {point_coords.shape[0]} points")
             
             # Simulate processing delay
             await asyncio.sleep(0.5)
             
-            # Create a simple mock result
-            result_image = image.copy()
+            # Create a simple mock result (in place, see _writable)
+            result_image = self._writable(image)
             mask = np.zeros(image.shape[:2], dtype=bool)
             
             # Create mock mask around first point
-            if point_coords:
+            if point_coords.shape[0]:
                 x, y = point_coords[0]
                 x, y = int(x), int(y)
                 # Create a small rectangle around the point
@@ -68,45 +82,37 @@ class MockInpaintService:
         text_prompt: str,
         dilate_kernel_size: Optional[int] = None
     ) -> Tuple[np.ndarray, np.ndarray]:
-        """Mock object filling - returns image with colored rectangle"""
+        """Mock object filling - returns image with colored rectangle (edits image in place)"""
         try:
             # Validate inputs
             point_coords = validate_coordinates(point_coords, image.shape)
-            point_labels = validate_point_labels(point_labels, len(point_coords))
+            point_labels = validate_point_labels(point_labels, point_coords.shape[0])
             
             if not text_prompt.strip():
                 raise InvalidImageException("Text prompt cannot be empty")
             
-            logger.info(f"Mock fill_object: '{text_prompt}' at {len(point_coords)} points")
+            logger.info(f"Mock fill_object: '{text_prompt}' at {point_coords.shape[0]} points")
             
             # Simulate processing delay
             await asyncio.sleep(1.0)
             
-            # Create a simple mock result
-            result_image = image.copy()
+            # Create a simple mock result (in place, see _writable)
+            result_image = self._writable(image)
             mask = np.zeros(image.shape[:2], dtype=bool)
             
             # Create mock mask and fill with color based on prompt
-            if point_coords:
+            if point_coords.shape[0]:
                 x, y = point_coords[0]
                 x, y = int(x), int(y)
                 size = 50
                 y1, y2 = max(0, y-size), min(image.shape[0], y+size)
                 x1, x2 = max(0, x-size), min(image.shape[1], x+size)
                 
-                # Choose color based on text prompt
-                if "red" in text_prompt.lower():
-                    color = [255, 0, 0]
-                elif "blue" in text_prompt.lower():
-                    color = [0, 0, 255]
-                elif "green" in text_prompt.lower():
-                    color = [0, 255, 0]
-                elif "flower" in text_prompt.lower():
-                    color = [255, 192, 203]  # Pink
-                elif "sky" in text_prompt.lower():
-                    color = [135, 206, 235]  # Sky blue
-                else:
-                    color = [128, 128, 128]  # Gray
+                # Choose color based on text prompt: one scan collects every keyword
+                # (overlapping, so "flowered" yields "flower" and "red"), then the
+                # highest-priority match wins
+                found = set(_PROMPT_COLOR_RE.findall(text_prompt.lower()))
+                color = _PROMPT_COLORS[min(found, key=_PROMPT_PRIORITY.get)] if found else _DEFAULT_COLOR
                 
                 result_image[y1:y2, x1:x2] = color
                 mask[y1:y2, x1:x2] = True
@@ -126,53 +132,49 @@ class MockInpaintService:
         dilate_kernel_size: Optional[int] = None,
         num_inference_steps: int = 50
     ) -> Tuple[np.ndarray, np.ndarray]:
-        """Mock background replacement - returns image with gradient background"""
+        """Mock background replacement - returns image with gradient background (edits image in place)"""
         try:
             # Validate inputs
             point_coords = validate_coordinates(point_coords, image.shape)
-            point_labels = validate_point_labels(point_labels, len(point_coords))
+            point_labels = validate_point_labels(point_labels, point_coords.shape[0])
             
             if not text_prompt.strip():
                 raise InvalidImageException("Text prompt cannot be empty")
             
-            logger.info(f"Mock replace_background: '{text_prompt}' at {len(point_coords)} points, steps={num_inference_steps}")
+            logger.info(f"Mock replace_background: '{text_prompt}' at {point_coords.shape[0]} points, steps={num_inference_steps}")
             
             # Simulate processing delay (more steps = longer delay)
             await asyncio.sleep(num_inference_steps / 100.0)
             
-            # Create a simple mock result
-            result_image = image.copy()
+            # Create a simple mock result (in place, see _writable)
+            result_image = self._writable(image)
             mask = np.zeros(image.shape[:2], dtype=bool)
             
             # Create mock mask and replace with gradient
-            if point_coords:
+            if point_coords.shape[0]:
                 x, y = point_coords[0]
                 x, y = int(x), int(y)
                 size = 80
                 y1, y2 = max(0, y-size), min(image.shape[0], y+size)
                 x1, x2 = max(0, x-size), min(image.shape[1], x+size)
                 
-                # Create gradient based on text prompt
-                height, width = y2 - y1, x2 - x1
+                # Create gradient based on text prompt (one value per row, same float
+                # expressions as the per-row loop so the output is byte-identical)
+                height = y2 - y1
+                rows = np.arange(height)
+                ratio = rows / height
+                prompt = text_prompt.lower()
                 
-                if "sunset" in text_prompt.lower():
+                if "sunset" in prompt:
                     # Orange to red gradient
-                    gradient = np.zeros((height, width, 3), dtype=np.uint8)
-                    for i in range(height):
-                        ratio = i / height
-                        gradient[i, :] = [255, int(165 * (1-ratio)), 0]
-                elif "ocean" in text_prompt.lower():
+                    gradient = self._vertical_gradient(255, 165 * (1 - ratio), 0)
+                elif "ocean" in prompt:
                     # Blue gradient
-                    gradient = np.zeros((height, width, 3), dtype=np.uint8)
-                    for i in range(height):
-                        ratio = i / height
-                        gradient[i, :] = [0, int(100 + 100 * ratio), 255]
+                    gradient = self._vertical_gradient(0, 100 + 100 * ratio, 255)
                 else:
                     # Default gradient (gray)
-                    gradient = np.zeros((height, width, 3), dtype=np.uint8)
-                    for i in range(height):
-                        val = int(100 + 100 * i / height)
-                        gradient[i, :] = [val, val, val]
+                    val = 100 + 100 * rows / height
+                    gradient = self._vertical_gradient(val, val, val)
                 
                 result_image[y1:y2, x1:x2] = gradient
                 mask[y1:y2, x1:x2] = True
@@ -184,5 +186,20 @@ class MockInpaintService:
             raise
 
 
+    @staticmethod
+    def _writable(image: np.ndarray) -> np.ndarray:
+        """Return image itself for in-place patch writes; callers pass an array they own
+        
+        Only read-only arrays are copied.
+        """
+        return image if image.flags.writeable else image.copy()
+
+    @staticmethod
+    def _vertical_gradient(red, green, blue) -> np.ndarray:
+        """(height, 1, 3) uint8 column from per-row channel values (truncated like int()),
+        broadcast across the width"""
+        return np.stack(np.broadcast_arrays(red, green, blue), axis=-1).astype(np.uint8)[:, None, :]
+
+
 # Global service instance
 mock_inpaint_service = MockInpaintService()
\ No newline at end of file
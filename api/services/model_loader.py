@@ -1,8 +1,12 @@
 import asyncio
+import threading
+import time
+import numpy as np
 import torch
 from typing import Optional
 from pathlib import Path
 import logging
+from PIL import Image
 
 from segment_anything import SamPredictor, sam_model_registry
 from diffusers import StableDiffusionInpaintPipeline
@@ -14,6 +18,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "lama"))
 from saicinpainting.training.trainers import load_checkpoint
 
 from config.settings import settings
+from api.services.executors import sam_executor, lama_executor, sd_executor, model_stream, sam_autocast
 
 logger = logging.getLogger(__name__)
 
@@ -25,32 +30,48 @@ class ModelLoader:
     _lama_config = None
     _sd_pipeline: Optional[StableDiffusionInpaintPipeline] = None
     _device: str = settings.device
+    # Metrics scrapes are frequent; don't hit the CUDA runtime on every one
+    _mem_cache: tuple = (0.0, None)
+    _mem_ttl: float = 0.25
+
+    # Guards singleton creation; the asyncio locks stop concurrent loads of one model
+    _lock = threading.Lock()
+    _sam_load_lock = asyncio.Lock()
+    _lama_load_lock = asyncio.Lock()
+    _sd_load_lock = asyncio.Lock()
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
         return cls._instance
 
     async def load_sam_model(self) -> SamPredictor:
         """Load SAM model asynchronously"""
         if self._sam_predictor is not None:
             return self._sam_predictor
-            
-        logger.info(f"Loading SAM model: {settings.sam_model_type}")
         
-        if not Path(settings.sam_checkpoint_path).exists():
-            raise FileNotFoundError(f"SAM checkpoint not found: {settings.sam_checkpoint_path}")
-        
-        # Run in executor for CPU-intensive model loading
-        loop = asyncio.get_event_loop()
-        sam, predictor = await loop.run_in_executor(
-            None, 
-            self._load_sam_sync
-        )
-        
-        self._sam_predictor = predictor
-        logger.info("SAM model loaded successfully")
-        return self._sam_predictor
+        async with self._sam_load_lock:
+            # Another caller may have finished loading while we waited
+            if self._sam_predictor is not None:
+                return self._sam_predictor
+            
+            logger.info(f"Loading SAM model: {settings.sam_model_type}")
+            
+            if not Path(settings.sam_checkpoint_path).exists():
+                raise FileNotFoundError(f"SAM checkpoint not found: {settings.sam_checkpoint_path}")
+            
+            # Load on the model's own executor thread, where inference will run
+            loop = asyncio.get_event_loop()
+            start = time.perf_counter()
+            sam, predictor = await loop.run_in_executor(
+                sam_executor,
+                self._load_sam_sync
+            )
+            
+            self._sam_predictor = predictor
+            logger.info(f"SAM model loaded successfully in {time.perf_counter() - start:.2f}s")
+            return self._sam_predictor
 
     def _load_sam_sync(self):
         """Synchronous SAM model loading"""
@@ -58,6 +79,10 @@ class ModelLoader:
             checkpoint=settings.sam_checkpoint_path
         )
         sam.to(device=self._device)
+        
+        if self._device == "cuda" and settings.sam_compile:
+            sam.image_encoder = torch.compile(sam.image_encoder, mode="max-autotune")
+        
         predictor = SamPredictor(sam)
         return sam, predictor
 
@@ -65,25 +90,31 @@ class ModelLoader:
         """Load LaMa model asynchronously"""
         if self._lama_model is not None:
             return self._lama_model, self._lama_config
-            
-        logger.info("Loading LaMa model")
-        
-        if not Path(settings.lama_config_path).exists():
-            raise FileNotFoundError(f"LaMa config not found: {settings.lama_config_path}")
-        if not Path(settings.lama_checkpoint_path).exists():
-            raise FileNotFoundError(f"LaMa checkpoint not found: {settings.lama_checkpoint_path}")
         
-        # Run in executor for CPU-intensive model loading  
-        loop = asyncio.get_event_loop()
-        model, config = await loop.run_in_executor(
-            None,
-            self._load_lama_sync
-        )
-        
-        self._lama_model = model
-        self._lama_config = config
-        logger.info("LaMa model loaded successfully")
-        return self._lama_model, self._lama_config
+        async with self._lama_load_lock:
+            # Another caller may have finished loading while we waited
+            if self._lama_model is not None:
+                return self._lama_model, self._lama_config
+            
+            logger.info("Loading LaMa model")
+            
+            if not Path(settings.lama_config_path).exists():
+                raise FileNotFoundError(f"LaMa config not found: {settings.lama_config_path}")
+            if not Path(settings.lama_checkpoint_path).exists():
+                raise FileNotFoundError(f"LaMa checkpoint not found: {settings.lama_checkpoint_path}")
+            
+            # Load on the model's own executor thread, where inference will run
+            loop = asyncio.get_event_loop()
+            start = time.perf_counter()
+            model, config = await loop.run_in_executor(
+                lama_executor,
+                self._load_lama_sync
+            )
+            
+            self._lama_model = model
+            self._lama_config = config
+            logger.info(f"LaMa model loaded successfully in {time.perf_counter() - start:.2f}s")
+            return self._lama_model, self._lama_config
 
     def _load_lama_sync(self):
         """Synchronous LaMa model loading"""
@@ -100,19 +131,25 @@ class ModelLoader:
         """Load Stable Diffusion pipeline asynchronously"""
         if self._sd_pipeline is not None:
             return self._sd_pipeline
-            
-        logger.info(f"Loading Stable Diffusion model: {settings.sd_model_name}")
         
-        # Run in executor for CPU-intensive model loading
-        loop = asyncio.get_event_loop()
-        pipeline = await loop.run_in_executor(
-            None,
-            self._load_sd_sync
-        )
-        
-        self._sd_pipeline = pipeline
-        logger.info("Stable Diffusion model loaded successfully")
-        return self._sd_pipeline
+        async with self._sd_load_lock:
+            # Another caller may have finished loading while we waited
+            if self._sd_pipeline is not None:
+                return self._sd_pipeline
+            
+            logger.info(f"Loading Stable Diffusion model: {settings.sd_model_name}")
+            
+            # Load on the model's own executor thread, where inference will run
+            loop = asyncio.get_event_loop()
+            start = time.perf_counter()
+            pipeline = await loop.run_in_executor(
+                sd_executor,
+                self._load_sd_sync
+            )
+            
+            self._sd_pipeline = pipeline
+            logger.info(f"Stable Diffusion model loaded successfully in {time.perf_counter() - start:.2f}s")
+            return self._sd_pipeline
 
     def _load_sd_sync(self):
         """Synchronous SD pipeline loading"""
@@ -120,11 +157,42 @@ class ModelLoader:
             settings.sd_model_name,
             torch_dtype=torch.float32 if self._device == "cpu" else torch.float16,
         ).to(self._device)
+        
+        if settings.sd_quantize in ("int8", "fp8"):
+            self._quantize_sd_unet(pipeline)
+        
+        if self._device == "cuda":
+            # Decode batched latents one image at a time to bound peak VRAM
+            pipeline.enable_vae_slicing()
+            try:
+                pipeline.enable_xformers_memory_efficient_attention()
+            except Exception as e:
+                # PyTorch 2.x uses SDPA attention by default
+                logger.info(f"xformers unavailable, using SDPA attention: {str(e)}")
+            
+            if settings.sd_compile:
+                pipeline.unet = torch.compile(pipeline.unet, mode="reduce-overhead", fullgraph=False)
+                pipeline.vae.decode = torch.compile(pipeline.vae.decode, mode="reduce-overhead", fullgraph=False)
+        
         return pipeline
 
+    def _quantize_sd_unet(self, pipeline):
+        """Quantize UNet weights in place with optimum.quanto"""
+        try:
+            from optimum.quanto import quantize, freeze, qint8, qfloat8
+        except ImportError:
+            logger.warning("optimum-quanto not installed, skipping SD UNet quantization")
+            return
+        
+        weights = qint8 if settings.sd_quantize == "int8" else qfloat8
+        quantize(pipeline.unet, weights=weights)
+        freeze(pipeline.unet)
+        logger.info(f"Quantized SD UNet weights to {settings.sd_quantize}")
+
     async def load_all_models(self):
         """Load all models concurrently"""
         logger.info("Loading all models...")
+        start = time.perf_counter()
         
         tasks = [
             self.load_sam_model(),
@@ -132,8 +200,67 @@ class ModelLoader:
             self.load_sd_pipeline(),
         ]
         
+        # Each load runs on its model's own executor thread, so they overlap;
+        # compare the total against the per-model times logged above
         await asyncio.gather(*tasks)
-        logger.info("All models loaded successfully")
+        logger.info(f"All models loaded successfully in {time.perf_counter() - start:.2f}s")
+        
+        if settings.warmup_on_load:
+            # Best-effort: the models are loaded, so a failed warmup must not stop serving
+            try:
+                await self.warmup()
+            except Exception as e:
+                logger.warning(f"Model warmup failed, continuing without it: {str(e)}")
+
+    async def warmup(self):
+        """Run each model once on its own executor so the first request skips
+        cuDNN autotuning and torch.compile tracing"""
+        logger.info("Warming up models...")
+        loop = asyncio.get_event_loop()
+        
+        await asyncio.gather(
+            loop.run_in_executor(sam_executor, self._warmup_sam_sync),
+            loop.run_in_executor(lama_executor, self._warmup_lama_sync),
+            loop.run_in_executor(sd_executor, self._warmup_sd_sync),
+        )
+        logger.info("Model warmup complete")
+
+    def _warmup_sam_sync(self):
+        """Encode a blank image and predict from a single point"""
+        with model_stream(), torch.inference_mode():
+            with sam_autocast():
+                self._sam_predictor.set_image(np.zeros((1024, 1024, 3), dtype=np.uint8))
+            self._sam_predictor.features = self._sam_predictor.features.float()
+            self._sam_predictor.predict(
+                point_coords=np.array([[512, 512]], dtype=np.float32),
+                point_labels=np.array([1], dtype=np.int32),
+                multimask_output=True,
+            )
+            self._sam_predictor.reset_image()
+
+    def _warmup_lama_sync(self):
+        """Inpaint a blank 512x512 image"""
+        from lama_inpaint import inpaint_img_with_builded_lama
+        
+        with model_stream(), torch.inference_mode():
+            inpaint_img_with_builded_lama(
+                self._lama_model,
+                np.zeros((512, 512, 3), dtype=np.uint8),
+                np.zeros((512, 512), dtype=np.uint8),
+                device=self._device
+            )
+
+    def _warmup_sd_sync(self):
+        """Run the SD pipeline for a single step"""
+        with model_stream(), torch.inference_mode():
+            self._sd_pipeline(
+                prompt="",
+                image=Image.new("RGB", (512, 512)),
+                mask_image=Image.new("L", (512, 512), 255),
+                num_inference_steps=1,
+            )
+        if self._device == "cuda":
+            torch.cuda.empty_cache()
 
     def get_sam_predictor(self) -> Optional[SamPredictor]:
         """Get loaded SAM predictor"""
@@ -160,21 +287,29 @@ class ModelLoader:
         return self._device
 
     def get_memory_usage(self) -> dict:
-        """Get memory usage statistics"""
+        """Get memory usage statistics (cached for _mem_ttl seconds)"""
+        ts, usage = self._mem_cache
+        now = time.monotonic()
+        if usage is not None and now - ts < self._mem_ttl:
+            return usage
+        
         if self._device == "cuda":
-            return {
+            usage = {
                 "device": self._device,
                 "allocated": torch.cuda.memory_allocated(),
                 "cached": torch.cuda.memory_reserved(),
                 "max_allocated": torch.cuda.max_memory_allocated(),
             }
         else:
-            return {
+            usage = {
                 "device": self._device,
                 "allocated": 0,
                 "cached": 0,
                 "max_allocated": 0,
             }
+        
+        self._mem_cache = (now, usage)
+        return usage
 
 
 # Global instance
@@ -4,12 +4,20 @@ Google Colab Setup Script for Inpaint Anything GPU Testing
 Run this in a Colab cell to set up the entire environment
 """
 
+import asyncio
+import concurrent.futures
+import ctypes
+import hashlib
+import importlib.util
 import subprocess
 import sys
 import os
 import time
-import requests
 import json
+import shlex
+import shutil
+import tarfile
+import tempfile
 import threading
 from pathlib import Path
 
@@ -17,57 +25,149 @@ from pathlib import Path
 PROJECT_NAME = "open-inpaint-anything"
 REPO_URL = "https://github.com/flytothejy/open-inpaint-anything.git"
 PROJECT_DIR = None
+PIP_INSTALL = [sys.executable, "-m", "pip", "install"]
 
-def run_command(command, description="", cwd=None):
-    """Run shell command and print status"""
+# Colab-optimized .env, written verbatim by create_colab_env
+COLAB_ENV_BYTES = b"""# Model Configuration (GPU optimized for Colab)
+SAM_MODEL_TYPE=vit_b
+SAM_CHECKPOINT_PATH=./pretrained_models/sam_vit_b_01ec64.pth
+LAMA_CONFIG_PATH=./lama/configs/prediction/default.yaml
+LAMA_CHECKPOINT_PATH=./pretrained_models/big-lama
+
+# Environment Settings
+USE_MOCK_SERVICE=false
+DEVICE=cuda
+LOG_LEVEL=INFO
+
+# Performance Settings
+SAM_DEVICE=cuda
+LAMA_DEVICE=cuda
+STABLE_DIFFUSION_DEVICE=cuda
+
+# Server Configuration
+HOST=0.0.0.0
+PORT=8000
+"""
+
+SERVER_PROCESS = None  # detached uvicorn subprocess.Popen, set by start_server_test
+GPU_INFO = None  # name / driver_version / memory_total of the first GPU, set by check_gpu
+HEALTH_URL = "http://localhost:8000/api/v1/health"
+# Startup loads (and on first run downloads) every model before health answers
+SERVER_READY_TIMEOUT = 600
+
+# Optional Google Drive cache for model weights (set COLAB_USE_DRIVE=1)
+DRIVE_MOUNT = "/content/drive"
+DRIVE_MODELS_DIR = os.path.join(DRIVE_MOUNT, "MyDrive", "inpaint_anything_models")
+DRIVE_HF_CACHE_DIR = os.path.join(DRIVE_MODELS_DIR, "huggingface")
+HF_CACHE_DIR = os.path.expanduser("~/.cache/huggingface")
+# Prebuilt dependency bundle: pip --target into LOCAL_DEPS_DIR once, tarred to Drive
+DRIVE_DEPS_DIR = os.path.join(DRIVE_MOUNT, "MyDrive", "inpaint_anything_deps")
+LOCAL_DEPS_DIR = "/content/deps"
+# pip's wheel/HTTP cache, kept on Drive so new VMs don't re-download torch
+DRIVE_PIP_CACHE_DIR = os.path.join(DRIVE_MOUNT, "MyDrive", "pip_cache")
+SD_MODEL_NAME = "stabilityai/stable-diffusion-2-inpainting"
+ARIA2C_LOCK = threading.Lock()  # one apt-get install across the parallel downloads
+
+def run_command(argv, description="", cwd=None):
+    """Run a command (argv list, no shell), streaming its output live"""
     print(f"🔄 {description}")
-    print(f"   Command: {command}")
+    print(f"   Command: {shlex.join(argv)}")
     
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, cwd=cwd)
-        if result.returncode == 0:
+        with subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, bufsize=1, cwd=cwd) as proc:
+            for line in proc.stdout:
+                print(f"   {line}", end="")
+            returncode = proc.wait()
+        if returncode == 0:
             print(f"✅ {description} - Success")
-            if result.stdout.strip():
-                print(f"   Output: {result.stdout.strip()[:200]}...")
         else:
-            print(f"❌ {description} - Failed")
-            print(f"   Error: {result.stderr.strip()[:200]}...")
-        return result.returncode == 0, result.stdout, result.stderr
+            print(f"❌ {description} - Failed (exit code {returncode})")
+        # Output was streamed, not kept; stderr is merged into it
+        return returncode == 0, "", ""
     except Exception as e:
         print(f"❌ {description} - Exception: {e}")
         return False, "", str(e)
 
+def run_async(coro):
+    """Run a coroutine to completion, also from inside a running (notebook) event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+class _NvmlMemory(ctypes.Structure):
+    _fields_ = [("total", ctypes.c_ulonglong), ("free", ctypes.c_ulonglong), ("used", ctypes.c_ulonglong)]
+
+def nvml_gpu_info():
+    """First GPU's name, driver and memory straight from NVML (no subprocess), or None"""
+    try:
+        nvml = ctypes.CDLL("libnvidia-ml.so.1")
+    except OSError:
+        return None
+    if nvml.nvmlInit_v2() != 0:
+        return None
+    
+    try:
+        count = ctypes.c_uint()
+        if nvml.nvmlDeviceGetCount_v2(ctypes.byref(count)) != 0 or count.value == 0:
+            return None
+        handle = ctypes.c_void_p()
+        if nvml.nvmlDeviceGetHandleByIndex_v2(0, ctypes.byref(handle)) != 0:
+            return None
+        
+        name = ctypes.create_string_buffer(96)
+        driver = ctypes.create_string_buffer(80)
+        memory = _NvmlMemory()
+        nvml.nvmlDeviceGetName(handle, name, len(name))
+        nvml.nvmlSystemGetDriverVersion(driver, len(driver))
+        nvml.nvmlDeviceGetMemoryInfo(handle, ctypes.byref(memory))
+        return {
+            "name": name.value.decode(),
+            "driver_version": driver.value.decode(),
+            "memory_total": f"{memory.total // (1024 * 1024)} MiB",
+        }
+    finally:
+        nvml.nvmlShutdown()
+
+def nvidia_smi_gpu_info():
+    """Fallback: first GPU's name, driver and memory from nvidia-smi CSV output, or None"""
+    if shutil.which("nvidia-smi") is None:
+        return None
+    result = subprocess.run(
+        ["nvidia-smi", "--query-gpu=name,driver_version,memory.total", "--format=csv,noheader"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    name, driver, memory = [field.strip() for field in result.stdout.splitlines()[0].split(",")]
+    return {"name": name, "driver_version": driver, "memory_total": memory}
+
 def check_gpu():
     """Check if GPU is available"""
     print("\n🔍 Checking GPU availability...")
     
-    # Check NVIDIA GPU
-    success, output, _ = run_command("nvidia-smi", "GPU status check")
-    if not success:
+    # Ask the driver directly; torch isn't needed (or maybe installed) to detect a GPU
+    global GPU_INFO
+    GPU_INFO = nvml_gpu_info() or nvidia_smi_gpu_info()
+    if GPU_INFO is None:
         print("❌ No GPU detected!")
         return False
     
     print("✅ GPU detected!")
-    # Extract GPU info from nvidia-smi output
-    lines = output.split('\n')
-    for line in lines:
-        if 'Tesla' in line or 'RTX' in line or 'GTX' in line or 'V100' in line or 'A100' in line:
-            print(f"   GPU: {line.strip()}")
-            break
-    
-    # Check PyTorch CUDA
+    print(f"   GPU: {GPU_INFO['name']} (driver {GPU_INFO['driver_version']}, {GPU_INFO['memory_total']})")
+    return True
+
+def repo_up_to_date(path):
+    """Compare local HEAD with the remote HEAD hash (no object transfer)"""
     try:
-        import torch
-        print(f"   PyTorch CUDA available: {torch.cuda.is_available()}")
-        if torch.cuda.is_available():
-            print(f"   CUDA version: {torch.version.cuda}")
-            print(f"   GPU count: {torch.cuda.device_count()}")
-            print(f"   Current device: {torch.cuda.current_device()}")
-            print(f"   Device name: {torch.cuda.get_device_name()}")
-        return torch.cuda.is_available()
-    except ImportError:
-        print("   PyTorch not installed yet")
-        return True  # GPU is available, PyTorch will be installed later
+        local = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=path, text=True).strip()
+        remote = subprocess.check_output(["git", "ls-remote", "origin", "HEAD"], cwd=path, text=True).split()
+    except (subprocess.CalledProcessError, OSError):
+        return False
+    return bool(remote) and remote[0] == local
 
 def clone_repository():
     """Clone the repository"""
@@ -77,12 +177,15 @@ def clone_repository():
     # Check if already cloned
     if os.path.exists(PROJECT_NAME):
         print("✅ Repository already exists")
-        success, _, _ = run_command("git pull", "Updating repository", cwd=PROJECT_NAME)
-        if not success:
-            print("⚠️  Git pull failed, continuing with existing files")
+        if repo_up_to_date(PROJECT_NAME):
+            print("✅ Repository is up to date")
+        else:
+            success, _, _ = run_command(["git", "pull"], "Updating repository", cwd=PROJECT_NAME)
+            if not success:
+                print("⚠️  Git pull failed, continuing with existing files")
     else:
         # Clone repository
-        success, _, _ = run_command(f"git clone {REPO_URL}", "Cloning repository")
+        success, _, _ = run_command(["git", "clone", REPO_URL], "Cloning repository")
         if not success:
             print("❌ Failed to clone repository")
             print("📝 Manual setup required:")
@@ -103,26 +206,70 @@ def install_dependencies():
         print("❌ Project directory not set!")
         return False
     
-    commands = [
-        ("pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cu121", 
-         "Installing PyTorch with CUDA 12.1"),
-        ("pip install -r requirements/base.txt", 
-         "Installing base requirements"),
-        ("pip install 'numpy==1.24.4' 'opencv-python==4.9.0.80'", 
-         "Installing compatible NumPy and OpenCV versions"),
-        ("pip install git+https://github.com/facebookresearch/segment-anything.git", 
-         "Installing Segment Anything"),
+    # One pip run resolves and downloads everything together. The CUDA index is
+    # primary so torch/torchvision/torchaudio come from the cu121 wheels; PyPI
+    # serves the rest. The explicit NumPy/OpenCV pins take part in the same resolve.
+    requirements = [
+        "--index-url", "https://download.pytorch.org/whl/cu121",
+        "--extra-index-url", "https://pypi.org/simple",
+        "torch", "torchvision", "torchaudio",
+        "numpy==1.24.4", "opencv-python==4.9.0.80",
+        "-r", "requirements/base.txt",
+        "git+https://github.com/facebookresearch/segment-anything.git",
+        "huggingface_hub[hf_transfer]", "httpx",
     ]
     
-    for command, description in commands:
-        cwd = PROJECT_DIR if "requirements/" in command else None
-        success, _, _ = run_command(command, description, cwd=cwd)
+    if not (drive_enabled() and mount_drive()):
+        success, _, _ = run_command(PIP_INSTALL + requirements, "Installing all dependencies", cwd=PROJECT_DIR)
         if not success:
-            print(f"⚠️  Failed to install: {description}")
+            print("⚠️  Failed to install dependencies")
             return False
+        return True
+    
+    os.makedirs(DRIVE_PIP_CACHE_DIR, exist_ok=True)
+    os.environ["PIP_CACHE_DIR"] = DRIVE_PIP_CACHE_DIR
+    
+    # With Drive, later sessions unpack the bundle built by the first one instead of running pip
+    bundle = os.path.join(DRIVE_DEPS_DIR, f"deps-{deps_key(requirements)}.tar")
+    if os.path.exists(bundle):
+        print(f"📦 Unpacking prebuilt dependencies from {bundle}")
+        with tarfile.open(bundle) as tar:
+            tar.extractall(LOCAL_DEPS_DIR, filter="data")
+        use_deps_dir(LOCAL_DEPS_DIR)
+        print("✅ Dependencies restored without pip")
+        return True
+    
+    command = PIP_INSTALL + ["--target", LOCAL_DEPS_DIR, "--upgrade"] + requirements
+    success, _, _ = run_command(command, "Installing all dependencies", cwd=PROJECT_DIR)
+    if not success:
+        print("⚠️  Failed to install dependencies")
+        return False
+    use_deps_dir(LOCAL_DEPS_DIR)
+    
+    # One uncompressed tar is far faster to copy through the Drive mount than thousands of small files
+    try:
+        os.makedirs(DRIVE_DEPS_DIR, exist_ok=True)
+        with tarfile.open(bundle + ".partial", "w") as tar:
+            tar.add(LOCAL_DEPS_DIR, arcname=".")
+        os.replace(bundle + ".partial", bundle)
+        print(f"✅ Dependency bundle saved to {bundle}")
+    except Exception as e:
+        print(f"⚠️  Could not save dependency bundle: {e}")
     
     return True
 
+def deps_key(requirements):
+    """Short hash of the pip arguments and requirements/base.txt, naming the dependency bundle"""
+    digest = hashlib.sha256("\0".join(requirements).encode())
+    digest.update(Path(PROJECT_DIR, "requirements", "base.txt").read_bytes())
+    return digest.hexdigest()[:16]
+
+def use_deps_dir(path):
+    """Put a pip --target directory ahead of site-packages here and in child processes"""
+    sys.path.insert(0, path)
+    importlib.invalidate_caches()
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [path, os.environ.get("PYTHONPATH")]))
+
 def create_colab_env():
     """Create Colab-optimized environment file"""
     print("\n⚙️  Creating Colab environment configuration...")
@@ -131,74 +278,205 @@ def create_colab_env():
         print("❌ Project directory not set!")
         return False
     
-    env_content = """# Model Configuration (GPU optimized for Colab)
-SAM_MODEL_TYPE=vit_b
-SAM_CHECKPOINT_PATH=./pretrained_models/sam_vit_b_01ec64.pth
-LAMA_CONFIG_PATH=./lama/configs/prediction/default.yaml
-LAMA_CHECKPOINT_PATH=./pretrained_models/big-lama
-
-# Environment Settings
-USE_MOCK_SERVICE=false
-DEVICE=cuda
-LOG_LEVEL=INFO
-
-# Performance Settings
-SAM_DEVICE=cuda
-LAMA_DEVICE=cuda
-STABLE_DIFFUSION_DEVICE=cuda
-
-# Server Configuration
-HOST=0.0.0.0
-PORT=8000
-"""
+    # Export the values too, so the server (which inherits os.environ) skips .env parsing.
+    # Variables already set in the environment keep precedence, as they do over .env
+    for key, value in parse_env_bytes(COLAB_ENV_BYTES):
+        os.environ.setdefault(key, value)
+    os.environ["COLAB_ENV_PREFILLED"] = "1"
     
-    env_file_path = os.path.join(PROJECT_DIR, '.env')
+    env_file_path = Path(PROJECT_DIR, '.env')
     try:
-        with open(env_file_path, 'w') as f:
-            f.write(env_content)
+        # Reruns with an unchanged file skip the write
+        if env_file_path.exists() and env_file_path.read_bytes() == COLAB_ENV_BYTES:
+            print("✅ Environment file already up to date")
+            return True
+        env_file_path.write_bytes(COLAB_ENV_BYTES)
         print("✅ Environment file created")
         return True
     except Exception as e:
         print(f"❌ Failed to create environment file: {e}")
         return False
 
-def download_models():
-    """Download AI models"""
-    print("\n🤖 Downloading AI models...")
+def parse_env_bytes(data):
+    """(key, value) pairs of a simple KEY=VALUE .env file, skipping blanks and comments"""
+    for line in data.decode().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and "=" in line:
+            key, _, value = line.partition("=")
+            yield key.strip(), value.strip()
+
+def link_to_drive(local_path, drive_path):
+    """Point local_path at drive_path, moving any existing local files over first"""
+    os.makedirs(drive_path, exist_ok=True)
+    if os.path.islink(local_path):
+        return
+    if os.path.isdir(local_path):
+        for name in os.listdir(local_path):
+            target = os.path.join(drive_path, name)
+            if not os.path.exists(target):
+                shutil.move(os.path.join(local_path, name), target)
+        shutil.rmtree(local_path)
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    os.symlink(drive_path, local_path)
+
+def drive_enabled():
+    """Whether the Google Drive cache is switched on (COLAB_USE_DRIVE=1)"""
+    return os.environ.get("COLAB_USE_DRIVE", "").lower() in ("1", "true", "yes")
+
+def mount_drive():
+    """Mount Google Drive once; False if it is unavailable"""
+    if os.path.ismount(DRIVE_MOUNT):
+        return True
+    try:
+        from google.colab import drive
+        drive.mount(DRIVE_MOUNT)
+        return True
+    except Exception as e:
+        print(f"⚠️  Google Drive unavailable: {e}")
+        return False
+
+def setup_drive_cache():
+    """Back pretrained_models/ and the Hugging Face cache with Google Drive (optional)"""
+    if not drive_enabled():
+        return True
+    
+    print("\n💾 Setting up Google Drive model cache...")
     
     if not PROJECT_DIR:
         print("❌ Project directory not set!")
         return False
     
-    # Make scripts executable
-    run_command("chmod +x scripts/download_models.sh", 
-                "Making download script executable", cwd=PROJECT_DIR)
+    if not mount_drive():
+        print("⚠️  Drive cache unavailable, downloading locally")
+        return True
     
-    # Check if models already exist
-    sam_model_path = os.path.join(PROJECT_DIR, 'pretrained_models/sam_vit_b_01ec64.pth')
-    if os.path.exists(sam_model_path):
-        print("✅ SAM models already downloaded")
-    else:
-        print("📥 Downloading models (this may take 5-10 minutes)...")
-        success, _, _ = run_command("./scripts/download_models.sh", 
-                                   "Downloading models", cwd=PROJECT_DIR)
-        if not success:
-            print("❌ Model download failed")
-            return False
+    try:
+        link_to_drive(os.path.join(PROJECT_DIR, "pretrained_models"), DRIVE_MODELS_DIR)
+        # diffusers reuses SD snapshots from the HF cache across sessions
+        link_to_drive(HF_CACHE_DIR, DRIVE_HF_CACHE_DIR)
+        print(f"✅ Models cached in {DRIVE_MODELS_DIR}")
+    except Exception as e:
+        print(f"⚠️  Drive cache unavailable, downloading locally: {e}")
     
     return True
 
-def verify_setup():
-    """Verify the setup"""
-    print("\n🔍 Verifying setup...")
+def missing_models():
+    """Names of expected model files/directories that are not present yet"""
+    expected = {
+        "SAM ViT-B": os.path.join(PROJECT_DIR, "pretrained_models", "sam_vit_b_01ec64.pth"),
+        "LaMa": os.path.join(PROJECT_DIR, "pretrained_models", "big-lama"),
+    }
+    return [name for name, path in expected.items() if not os.path.exists(path)]
+
+def fetch_file(repo_id, filename):
+    """Download one hub file; aria2c (16 connections) when hf_transfer is missing or fails"""
+    from huggingface_hub import hf_hub_download, hf_hub_url
+    if importlib.util.find_spec("hf_transfer") is not None:
+        try:
+            return hf_hub_download(repo_id=repo_id, filename=filename)
+        except Exception as e:
+            print(f"⚠️  {filename}: hub download failed ({e}), retrying with aria2c")
+    
+    if not ensure_aria2c():
+        return hf_hub_download(repo_id=repo_id, filename=filename)
+    
+    target_dir = os.path.join(tempfile.gettempdir(), "inpaint_downloads")
+    target = os.path.join(target_dir, os.path.basename(filename))
+    result = subprocess.run(
+        ["aria2c", "-x16", "-s16", "-k1M", "--allow-overwrite=true", "--console-log-level=warn",
+         "-d", target_dir, "-o", os.path.basename(filename), hf_hub_url(repo_id, filename)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"aria2c failed: {result.stdout.strip()[-500:]}")
+    return target
+
+def ensure_aria2c():
+    """Whether aria2c is available, installing it with apt-get on first use if possible"""
+    with ARIA2C_LOCK:
+        if shutil.which("aria2c") is None and shutil.which("apt-get") is not None:
+            subprocess.run(["apt-get", "install", "-y", "-qq", "aria2"], capture_output=True)
+        return shutil.which("aria2c") is not None
+
+def fetch_sam():
+    """Download the SAM ViT-B checkpoint from the Hugging Face hub"""
+    path = fetch_file("ybelkada/segment-anything", "checkpoints/sam_vit_b_01ec64.pth")
+    shutil.copyfile(path, os.path.join(PROJECT_DIR, "pretrained_models", "sam_vit_b_01ec64.pth"))
+
+def fetch_lama():
+    """Download and extract the big-lama checkpoint from the Hugging Face hub"""
+    path = fetch_file("smartywu/big-lama", "big-lama.zip")
+    shutil.unpack_archive(path, os.path.join(PROJECT_DIR, "pretrained_models"), "zip")
+
+def fetch_sd():
+    """Download the diffusers SD pipeline files into the Hugging Face cache"""
+    from huggingface_hub import snapshot_download
+    # Only the fp32 safetensors diffusers loads, not the original ckpt / fp16 variants
+    snapshot_download(
+        SD_MODEL_NAME,
+        ignore_patterns=["*.ckpt", "*.bin", "*.msgpack", "*.onnx*", "*.fp16.*", "512-inpainting-ema.*"],
+    )
+
+def sd_snapshot_cached():
+    """Whether the SD pipeline is already in the Hugging Face hub cache"""
+    repo_dir = "models--" + SD_MODEL_NAME.replace("/", "--")
+    return os.path.isdir(os.path.join(HF_CACHE_DIR, "hub", repo_dir, "snapshots"))
+
+def download_models():
+    """Download AI models"""
+    print("\n🤖 Downloading AI models...")
     
     if not PROJECT_DIR:
         print("❌ Project directory not set!")
         return False
     
-    success, _, _ = run_command("python scripts/verify_models.py", 
-                               "Verifying models", cwd=PROJECT_DIR)
-    return success
+    # Check which models already exist
+    fetchers = {"SAM ViT-B": fetch_sam, "LaMa": fetch_lama}
+    jobs = {name: fetchers[name] for name in missing_models()}
+    if not sd_snapshot_cached():
+        jobs["Stable Diffusion"] = fetch_sd
+    if not jobs:
+        print("✅ All models already downloaded")
+        return True
+    
+    # Multi-connection Rust downloader, if installed (must be set before import)
+    if importlib.util.find_spec("hf_transfer") is not None:
+        os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"
+    
+    if importlib.util.find_spec("huggingface_hub") is None:
+        return download_models_with_script()
+    
+    os.makedirs(os.path.join(PROJECT_DIR, "pretrained_models"), exist_ok=True)
+    print(f"📥 Downloading {', '.join(jobs)} in parallel (this may take 5-10 minutes)...")
+    
+    ok = True
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+        futures = {pool.submit(fetch): name for name, fetch in jobs.items()}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                print(f"✅ {name} downloaded")
+            except Exception as e:
+                print(f"❌ {name} download failed: {e}")
+                ok = False
+    
+    return ok
+
+def download_models_with_script():
+    """Fallback: download SAM and LaMa with scripts/download_models.sh"""
+    # Make scripts executable
+    run_command(["chmod", "+x", "scripts/download_models.sh"], 
+                "Making download script executable", cwd=PROJECT_DIR)
+    
+    success, _, _ = run_command(["./scripts/download_models.sh"], 
+                               "Downloading models", cwd=PROJECT_DIR)
+    if not success:
+        print("❌ Model download failed")
+        return False
+    
+    print("ℹ️  Stable Diffusion will be downloaded on first server start")
+    return True
 
 def start_server_test():
     """Start server for testing"""
@@ -208,61 +486,121 @@ def start_server_test():
         print("❌ Project directory not set!")
         return False
     
-    def run_server():
-        """Run the FastAPI server"""
-        subprocess.run([
-            sys.executable, "-m", "uvicorn", 
-            "api.main:app", 
-            "--host", "0.0.0.0", 
-            "--port", "8000"
-        ], cwd=PROJECT_DIR)
-    
-    server_thread = threading.Thread(target=run_server, daemon=True)
-    server_thread.start()
-    
-    # Wait for server to start
+    # Detached in its own session, so the server outlives this script (`!python colab_setup.py`);
+    # stop_server() terminates it and frees its CUDA memory
+    global SERVER_PROCESS
+    SERVER_PROCESS = subprocess.Popen([
+        sys.executable, "-m", "uvicorn",
+        "api.main:app",
+        "--host", "0.0.0.0",
+        "--port", "8000",
+        "--workers", str(server_workers()),
+        "--loop", "uvloop",
+        "--http", "httptools"
+    ], cwd=PROJECT_DIR, start_new_session=True)
+    
+    # Wait for server to start (health answers once startup has loaded the models)
     print("⏳ Waiting for server to start...")
-    time.sleep(15)
-    
-    # Test health endpoint
     try:
-        response = requests.get('http://localhost:8000/api/v1/health', timeout=10)
-        if response.status_code == 200:
-            result = response.json()
-            print("✅ Server is running!")
-            print(f"   Status: {result.get('status', 'unknown')}")
-            print(f"   Device: {result.get('device', 'unknown')}")
-            
-            models = result.get('models_loaded', {})
-            print("   Models loaded:")
-            for model, loaded in models.items():
-                status = "✅" if loaded else "❌"
-                print(f"     {model}: {status}")
-            
-            return True
-        else:
-            print(f"❌ Server health check failed: {response.status_code}")
-            return False
+        result = run_async(wait_ready(HEALTH_URL, is_alive=server_alive))
     except Exception as e:
         print(f"❌ Server test failed: {e}")
+        stop_server()
         return False
+    
+    if result is None:
+        print(f"❌ Server health check failed: not ready after {SERVER_READY_TIMEOUT}s")
+        stop_server()
+        return False
+    
+    print("✅ Server is running!")
+    print(f"   Status: {result.get('status', 'unknown')}")
+    print(f"   Device: {result.get('device', 'unknown')}")
+    
+    # The startup health report doubles as model verification (no second torch import)
+    models = result.get('models_loaded', {})
+    print("   Models loaded:")
+    for model, loaded in models.items():
+        status = "✅" if loaded else "❌"
+        print(f"     {model}: {status}")
+    
+    if not all(models.values()):
+        print("⚠️  Some models failed to load. Quick fixes:")
+        print("   - Run: ./scripts/download_models.sh")
+        print("   - Run: python scripts/verify_models.py (for a per-file report)")
+    
+    return True
+
+def server_alive():
+    """Whether the server process started by start_server_test is still running"""
+    return SERVER_PROCESS is not None and SERVER_PROCESS.poll() is None
+
+def stop_server():
+    """Terminate the server process started by start_server_test, if any"""
+    if server_alive():
+        SERVER_PROCESS.terminate()
+        try:
+            SERVER_PROCESS.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            SERVER_PROCESS.kill()
 
-def setup_ngrok():
+def server_workers():
+    """One worker per GPU (each worker loads every model); one per core on CPU"""
+    if os.environ.get("DEVICE", "cuda") == "cpu":
+        return os.cpu_count() or 1
+    return 1
+
+async def wait_ready(url, is_alive=lambda: True, timeout=None):
+    """Poll url with exponential backoff; return its JSON once it answers 200, else None"""
+    import httpx
+    
+    deadline = time.monotonic() + (timeout or SERVER_READY_TIMEOUT)
+    delay = 0.2
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline and is_alive():
+            try:
+                response = await client.get(url, timeout=2)
+                if response.status_code == 200:
+                    return response.json()
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 2.0)
+    return None
+
+def start_ngrok_install():
+    """Install pyngrok quietly in a background thread (it has no dependency on the server)"""
+    result = {}
+    
+    def install():
+        try:
+            result["proc"] = subprocess.run(PIP_INSTALL + ["-q", "pyngrok"], capture_output=True, text=True)
+        except Exception as e:
+            result["error"] = e
+    
+    thread = threading.Thread(target=install, daemon=True)
+    thread.start()
+    return thread, result
+
+def setup_ngrok(install):
     """Set up ngrok for external access (optional)"""
     print("\n🌐 Setting up ngrok (optional)...")
     
-    try:
-        run_command("pip install pyngrok", "Installing pyngrok")
-        
-        print("🔗 To use ngrok:")
-        print("   1. Get your authtoken from https://ngrok.com/")
-        print("   2. Run: from pyngrok import ngrok")
-        print("   3. Run: ngrok.set_auth_token('your_token')")
-        print("   4. Run: public_url = ngrok.connect(8000)")
-        print("   5. Print public_url to get external access URL")
-        
-    except Exception as e:
-        print(f"⚠️  ngrok setup failed: {e}")
+    thread, result = install
+    thread.join()
+    proc = result.get("proc")
+    if proc is None or proc.returncode != 0:
+        error = result.get("error") or proc.stderr.strip()[-500:]
+        print(f"⚠️  ngrok setup failed: {error}")
+        return
+    
+    print("✅ pyngrok installed")
+    print("🔗 To use ngrok:")
+    print("   1. Get your authtoken from https://ngrok.com/")
+    print("   2. Run: from pyngrok import ngrok")
+    print("   3. Run: ngrok.set_auth_token('your_token')")
+    print("   4. Run: public_url = ngrok.connect(8000)")
+    print("   5. Print public_url to get external access URL")
 
 def main():
     """Main setup function"""
@@ -288,15 +626,16 @@ def main():
     if not create_colab_env():
         return False
     
-    # Step 5: Download models
+    # Step 5: Download models (through the Drive cache if enabled)
+    if not setup_drive_cache():
+        return False
     if not download_models():
         return False
     
-    # Step 6: Verify setup
-    if not verify_setup():
-        print("⚠️  Setup verification had issues, but continuing...")
+    # pyngrok installs while the server loads the models
+    ngrok_install = start_ngrok_install()
     
-    # Step 7: Test server
+    # Step 6: Start the server and verify the models through its health report
     if not start_server_test():
         print("❌ Setup completed but server test failed")
         print("🔧 Troubleshooting:")
@@ -305,8 +644,8 @@ def main():
         print("   3. Check GPU memory usage")
         return False
     
-    # Step 8: Setup ngrok (optional)
-    setup_ngrok()
+    # Step 7: Setup ngrok (optional)
+    setup_ngrok(ngrok_install)
     
     print("\n🎉 Setup completed successfully!")
     print("🔗 FastAPI server running at: http://localhost:8000")
@@ -1,10 +1,28 @@
-from pydantic_settings import BaseSettings
-from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import Field, ValidationInfo, field_validator, model_validator
 from typing import List, Optional
-import torch
+from functools import lru_cache
+import os
+import shutil
+import sys
 from pathlib import Path
 
 
+@lru_cache(maxsize=1)
+def _cuda_available() -> bool:
+    """CUDA probe, skipping CUDA initialization on Linux hosts with no sign of an NVIDIA driver"""
+    # WSL2 has no /proc/driver/nvidia but exposes the GPU via /dev/dxg; any hint defers to torch
+    if sys.platform.startswith("linux") and not (
+        os.path.exists("/proc/driver/nvidia/version")
+        or os.path.exists("/dev/dxg")
+        or shutil.which("nvidia-smi")
+    ):
+        return False
+    # Imported here so settings never load torch when DEVICE is set explicitly
+    import torch
+    return torch.cuda.is_available()
+
+
 class Settings(BaseSettings):
     environment: str = Field(default="development", env="ENVIRONMENT")
     debug: bool = Field(default=True, env="DEBUG")
@@ -14,6 +32,10 @@ class Settings(BaseSettings):
     api_prefix: str = Field(default="/api/v1", env="API_PREFIX")
     
     sam_model_type: str = Field(default="vit_h", env="SAM_MODEL_TYPE")
+    sam_embedding_cache_size: int = Field(default=8, env="SAM_EMBEDDING_CACHE_SIZE")
+    # SAM image encoder: bf16 autocast and torch.compile (CUDA only)
+    sam_bf16: bool = Field(default=True, env="SAM_BF16")
+    sam_compile: bool = Field(default=False, env="SAM_COMPILE")
     sam_checkpoint_path: str = Field(
         default="./pretrained_models/sam_vit_h_4b8939.pth",
         env="SAM_CHECKPOINT_PATH"
@@ -33,12 +55,25 @@ class Settings(BaseSettings):
         env="SD_MODEL_NAME"
     )
     
+    # Stable Diffusion request batching
+    sd_max_batch_size: int = Field(default=4, env="SD_MAX_BATCH_SIZE")
+    sd_batch_wait_ms: int = Field(default=10, env="SD_BATCH_WAIT_MS")
+    
+    # Compile the SD UNet/VAE with torch.compile (CUDA only, slow first load)
+    sd_compile: bool = Field(default=False, env="SD_COMPILE")
+    # Quantize SD UNet weights at load time: "none", "int8" or "fp8" (needs optimum-quanto)
+    sd_quantize: str = Field(default="none", env="SD_QUANTIZE")
+    
     max_image_size: int = Field(default=2048, env="MAX_IMAGE_SIZE")
     max_file_size: int = Field(default=10485760, env="MAX_FILE_SIZE")  # 10MB
     
     allowed_origins: str = Field(default="*", env="ALLOWED_ORIGINS")
     
-    device: str = Field(default="auto", env="DEVICE")
+    device: str = Field(default="auto", env="DEVICE", validate_default=True)
+    
+    # Run each model once at startup so the first request is not a cold start.
+    # Unset means on for CUDA only (a full SD/LaMa pass on CPU takes minutes)
+    warmup_on_load: Optional[bool] = Field(default=None, env="WARMUP_ON_LOAD", validate_default=True)
     
     # CPU Optimization
     omp_num_threads: Optional[int] = Field(default=None, env="OMP_NUM_THREADS")
@@ -46,23 +81,47 @@ class Settings(BaseSettings):
     
     use_mock_service: bool = Field(default=False, env="USE_MOCK_SERVICE")
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    # Frozen: settings are read-only after load (and hashable). The Colab setup
+    # exports its .env into the environment, so dotenv parsing is skipped there
+    model_config = SettingsConfigDict(
+        env_file=None if os.environ.get("COLAB_ENV_PREFILLED") == "1" else ".env",
+        case_sensitive=False,
+        frozen=True,
+    )
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        if self.device == "auto":
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            
+    @field_validator("device")
+    @classmethod
+    def resolve_device(cls, v: str) -> str:
+        if v == "auto":
+            return "cuda" if _cuda_available() else "cpu"
+        return v
+
+    @field_validator("warmup_on_load")
+    @classmethod
+    def resolve_warmup(cls, v: Optional[bool], info: ValidationInfo) -> bool:
+        if v is None:
+            return info.data.get("device") == "cuda"
+        return v
+
+    @model_validator(mode="after")
+    def apply_device_options(self):
         # Apply CPU optimizations
         if self.device == "cpu":
             if self.omp_num_threads:
+                import torch
                 torch.set_num_threads(self.omp_num_threads)
                 print(f"Set PyTorch threads to {self.omp_num_threads}")
             
-        if not torch.cuda.is_available() and not self.use_mock_service:
+        if self.device == "cpu" and not self.use_mock_service:
             print("Warning: CUDA not available. Using CPU mode with optimizations.")
+        
+        return self
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Settings singleton; .env is parsed and validated once per process"""
+    return Settings()
 
 
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
\ No newline at end of file
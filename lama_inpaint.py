@@ -117,12 +117,16 @@ def inpaint_img_with_builded_lama(
         mask: np.ndarray,
         config_p=None,
         mod=8,
-        device="cuda"
+        device="cuda",
+        img_tensor=None
 ):
     assert len(mask.shape) == 2
     if np.max(mask) == 1:
         mask = mask * 255
-    img = torch.from_numpy(img).float().div(255.)
+    # img_tensor: optional (pinned) uint8 HWC tensor of img, uploaded before float conversion
+    if img_tensor is None:
+        img_tensor = torch.from_numpy(img)
+    img = img_tensor.to(device, non_blocking=True).float().div(255.)
     mask = torch.from_numpy(mask).float()
 
     batch = {}
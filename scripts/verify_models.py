@@ -3,30 +3,41 @@
 Model verification script for Inpaint Anything
 """
 
+import importlib
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-import torch
-from omegaconf import OmegaConf
+from typing import Optional
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-def check_file_exists(path: str, description: str) -> bool:
+@lru_cache(maxsize=None)
+def stat_path(path: str) -> Optional[os.stat_result]:
+    """os.stat once per path for the whole run (existence and size from one syscall)"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+def check_file_exists(path: str, description: str, log=print) -> bool:
     """Check if file exists and report status"""
-    if os.path.exists(path):
-        size = os.path.getsize(path) / (1024**3)  # Size in GB
-        print(f"✅ {description}: {path} ({size:.2f} GB)")
+    st = stat_path(path)
+    if st is not None:
+        size = st.st_size / (1024**3)  # Size in GB
+        log(f"✅ {description}: {path} ({size:.2f} GB)")
         return True
     else:
-        print(f"❌ {description}: {path} (missing)")
+        log(f"❌ {description}: {path} (missing)")
         return False
 
-def verify_sam_models():
+def verify_sam_models(log=print):
     """Verify SAM model files"""
-    print("\n🔍 Checking SAM Models:")
-    print("=" * 50)
+    log("\n🔍 Checking SAM Models:")
+    log("=" * 50)
     
     sam_models = [
         ("pretrained_models/sam_vit_h_4b8939.pth", "SAM ViT-H (default)"),
@@ -37,52 +48,66 @@ def verify_sam_models():
     
     results = []
     for path, desc in sam_models:
-        results.append(check_file_exists(path, desc))
+        results.append(check_file_exists(path, desc, log))
     
     # At least one SAM model should exist
     if not any(results[:3]):  # Check main SAM models
-        print("⚠️  Warning: No main SAM models found!")
+        log("⚠️  Warning: No main SAM models found!")
         return False
     
     return True
 
-def verify_lama_model():
+def find_checkpoints(directory: str) -> list:
+    """DirEntry objects of all .pth/.ckpt files below directory, in one scandir walk"""
+    found = []
+    pending = [directory]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.endswith((".pth", ".ckpt")):
+                    found.append(entry)
+    return found
+
+def verify_lama_model(log=print):
     """Verify LaMa model files"""
-    print("\n🎨 Checking LaMa Model:")
-    print("=" * 50)
+    log("\n🎨 Checking LaMa Model:")
+    log("=" * 50)
     
     # Check LaMa directory
     lama_dir = "pretrained_models/big-lama"
-    if not os.path.exists(lama_dir):
-        print(f"❌ LaMa directory: {lama_dir} (missing)")
+    if stat_path(lama_dir) is None:
+        log(f"❌ LaMa directory: {lama_dir} (missing)")
         return False
     
     # Check for checkpoint files (.pth or .ckpt)
-    checkpoint_files = list(Path(lama_dir).glob("**/*.pth")) + list(Path(lama_dir).glob("**/*.ckpt"))
+    checkpoint_files = find_checkpoints(lama_dir)
     if checkpoint_files:
-        print(f"✅ LaMa model: {lama_dir} ({len(checkpoint_files)} checkpoint files)")
+        log(f"✅ LaMa model: {lama_dir} ({len(checkpoint_files)} checkpoint files)")
         for ckpt in checkpoint_files[:3]:  # Show first 3 files
             size = ckpt.stat().st_size / (1024**2)  # Size in MB
-            print(f"   - {ckpt.name} ({size:.1f} MB)")
+            log(f"   - {ckpt.name} ({size:.1f} MB)")
     else:
-        print(f"❌ LaMa model: {lama_dir} (no checkpoint files found)")
+        log(f"❌ LaMa model: {lama_dir} (no checkpoint files found)")
         return False
     
     # Check LaMa config
     config_path = "lama/configs/prediction/default.yaml"
-    if check_file_exists(config_path, "LaMa config"):
+    if check_file_exists(config_path, "LaMa config", log):
         try:
+            from omegaconf import OmegaConf  # imported only when there is a config to load
             config = OmegaConf.load(config_path)
-            print(f"   - Config loaded successfully")
+            log(f"   - Config loaded successfully")
         except Exception as e:
-            print(f"   - ⚠️  Config load error: {e}")
+            log(f"   - ⚠️  Config load error: {e}")
     
     return True
 
-def verify_dependencies():
+def verify_dependencies(log=print):
     """Verify Python dependencies"""
-    print("\n📦 Checking Dependencies:")
-    print("=" * 50)
+    log("\n📦 Checking Dependencies:")
+    log("=" * 50)
     
     dependencies = [
         ("torch", "PyTorch"),
@@ -94,31 +119,42 @@ def verify_dependencies():
         ("PIL", "Pillow")
     ]
     
-    missing = []
-    for module, name in dependencies:
+    def probe(module):
         try:
-            if module == "PIL":
-                import PIL
-                version = PIL.__version__
-            else:
-                mod = __import__(module)
-                version = getattr(mod, '__version__', 'unknown')
-            print(f"✅ {name}: {version}")
+            mod = importlib.import_module(module)
+            return getattr(mod, '__version__', 'unknown')
         except ImportError:
-            print(f"❌ {name}: not installed")
+            return None
+    
+    # Imports spend much of their time in file I/O and C extension loading, so they overlap
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        versions = list(executor.map(probe, [module for module, _ in dependencies]))
+    
+    missing = []
+    for (module, name), version in zip(dependencies, versions):
+        if version is not None:
+            log(f"✅ {name}: {version}")
+        else:
+            log(f"❌ {name}: not installed")
             missing.append(name)
     
     if missing:
-        print(f"\n⚠️  Missing dependencies: {', '.join(missing)}")
-        print("Run: pip install -r requirements/base.txt")
+        log(f"\n⚠️  Missing dependencies: {', '.join(missing)}")
+        log("Run: pip install -r requirements/base.txt")
         return False
     
     return True
 
-def check_cuda():
+def check_cuda(log=print):
     """Check CUDA availability"""
-    print("\n🚀 Checking CUDA:")
-    print("=" * 50)
+    log("\n🚀 Checking CUDA:")
+    log("=" * 50)
+    
+    try:
+        import torch  # deferred: ~1s, and only this check needs it
+    except ImportError:
+        log("❌ PyTorch not installed, cannot check CUDA")
+        return False
     
     if torch.cuda.is_available():
         device_count = torch.cuda.device_count()
@@ -126,50 +162,63 @@ def check_cuda():
         device_name = torch.cuda.get_device_name(current_device)
         memory = torch.cuda.get_device_properties(current_device).total_memory / (1024**3)
         
-        print(f"✅ CUDA available: {device_count} device(s)")
-        print(f"   - Current device: {current_device}")
-        print(f"   - Device name: {device_name}")
-        print(f"   - Memory: {memory:.1f} GB")
+        log(f"✅ CUDA available: {device_count} device(s)")
+        log(f"   - Current device: {current_device}")
+        log(f"   - Device name: {device_name}")
+        log(f"   - Memory: {memory:.1f} GB")
         
         return True
     else:
-        print("❌ CUDA not available (will use CPU)")
-        print("   - Model loading will be slower")
-        print("   - Consider setting USE_MOCK_SERVICE=true for testing")
+        log("❌ CUDA not available (will use CPU)")
+        log("   - Model loading will be slower")
+        log("   - Consider setting USE_MOCK_SERVICE=true for testing")
         return False
 
-def test_model_loading():
+def test_model_loading(log=print):
     """Test basic model loading"""
-    print("\n🧪 Testing Model Loading:")
-    print("=" * 50)
+    log("\n🧪 Testing Model Loading:")
+    log("=" * 50)
     
+    # diffusers is independent of SAM and LaMa (and the slowest), so it imports in the background.
+    # LaMa stays on this thread since it mutates sys.path
+    executor = ThreadPoolExecutor(max_workers=1)
+    diffusers_import = executor.submit(importlib.import_module, "diffusers")
     try:
         # Test SAM model import
         from segment_anything import sam_model_registry
-        print("✅ SAM model registry imported")
+        log("✅ SAM model registry imported")
         
         # Test basic SAM model creation (without checkpoint)
-        if os.path.exists("pretrained_models/sam_vit_h_4b8939.pth"):
-            print("✅ SAM checkpoint file accessible")
+        if stat_path("pretrained_models/sam_vit_h_4b8939.pth") is not None:
+            log("✅ SAM checkpoint file accessible")
         
         # Test LaMa imports
         sys.path.insert(0, str(project_root / "lama"))
         try:
             from saicinpainting.training.trainers import load_checkpoint
-            print("✅ LaMa modules imported")
+            log("✅ LaMa modules imported")
         except ImportError as e:
-            print(f"❌ LaMa import error: {e}")
+            log(f"❌ LaMa import error: {e}")
             return False
         
         # Test Stable Diffusion
+        diffusers_import.result()
         from diffusers import StableDiffusionInpaintPipeline
-        print("✅ Stable Diffusion pipeline imported")
+        log("✅ Stable Diffusion pipeline imported")
         
         return True
         
     except Exception as e:
-        print(f"❌ Model loading test failed: {e}")
+        log(f"❌ Model loading test failed: {e}")
         return False
+    finally:
+        # An early failure doesn't wait for the background import
+        executor.shutdown(wait=False)
+
+def run_collected(check):
+    """Run a check with its log lines collected; returns (result, lines)"""
+    lines = []
+    return check(log=lines.append), lines
 
 def main():
     """Main verification function"""
@@ -180,14 +229,15 @@ def main():
     os.chdir(project_root)
     print(f"📁 Working directory: {os.getcwd()}")
     
-    results = []
-    
-    # Run all checks
-    results.append(verify_dependencies())
-    results.append(verify_sam_models())
-    results.append(verify_lama_model())
-    results.append(check_cuda())
-    results.append(test_model_loading())
+    # Run all checks concurrently; each one's log lines are collected and printed in order
+    checks = (verify_dependencies, verify_sam_models, verify_lama_model, check_cuda, test_model_loading)
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [executor.submit(run_collected, check) for check in checks]
+        results = []
+        for future in futures:
+            result, lines = future.result()
+            print("\n".join(lines))
+            results.append(result)
     
     # Summary
     print("\n📊 Verification Summary:")
@@ -6,6 +6,7 @@ import torch
 import numpy as np
 import PIL.Image as Image
 from pathlib import Path
+from typing import List
 from diffusers import StableDiffusionInpaintPipeline
 from utils.mask_processing import crop_for_filling_pre, crop_for_filling_post
 from utils.crop_for_replacing import recover_size, resize_and_pad
@@ -58,6 +59,50 @@ def replace_img_with_sd(
     return img_resized
 
 
+def fill_img_with_sd_batch(
+        pipe,
+        imgs: List[np.ndarray],
+        masks: List[np.ndarray],
+        text_prompts: List[str],
+):
+    # every crop is crop_size x crop_size, so the batch runs in one pipe call
+    crops = [crop_for_filling_pre(img, mask) for img, mask in zip(imgs, masks)]
+    imgs_crop_filled = pipe(
+        prompt=text_prompts,
+        image=[Image.fromarray(img_crop) for img_crop, _ in crops],
+        mask_image=[Image.fromarray(mask_crop) for _, mask_crop in crops]
+    ).images
+    return [
+        crop_for_filling_post(img, mask, np.array(img_crop_filled))
+        for img, mask, img_crop_filled in zip(imgs, masks, imgs_crop_filled)
+    ]
+
+
+def replace_img_with_sd_batch(
+        pipe,
+        imgs: List[np.ndarray],
+        masks: List[np.ndarray],
+        text_prompts: List[str],
+        step: int = 50,
+):
+    padded = [resize_and_pad(img, mask) for img, mask in zip(imgs, masks)]
+    imgs_padded = pipe(
+        prompt=text_prompts,
+        image=[Image.fromarray(img_padded) for img_padded, _, _ in padded],
+        mask_image=[Image.fromarray(255 - mask_padded) for _, mask_padded, _ in padded],
+        num_inference_steps=step,
+    ).images
+    imgs_replaced = []
+    for img, (_, mask_padded, padding_factors), img_padded in zip(imgs, padded, imgs_padded):
+        height, width, _ = img.shape
+        img_resized, mask_resized = recover_size(
+            np.array(img_padded), mask_padded, (height, width), padding_factors)
+        mask_resized = np.expand_dims(mask_resized, -1) / 255
+        img_resized = img_resized * (1-mask_resized) + img * mask_resized
+        imgs_replaced.append(img_resized.astype(np.uint8))
+    return imgs_replaced
+
+
 def setup_args(parser):
     parser.add_argument(
         "--input_img", type=str, required=True,
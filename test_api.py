@@ -4,165 +4,171 @@ Simple API test script for Inpaint Anything FastAPI server
 """
 
 import requests
-import json
-import base64
+import orjson
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from PIL import Image
 import io
 import numpy as np
 
 # Test configuration
 API_BASE = "http://localhost:8000/api/v1"
+
+# One keep-alive connection pool shared by every request (and test thread)
+SESSION = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=1)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 TEST_IMAGE_SIZE = (300, 200)
 
+@lru_cache(maxsize=1)
 def create_test_image():
-    """Create a simple test image"""
-    # Create a gradient image
-    img = np.zeros((*TEST_IMAGE_SIZE[::-1], 3), dtype=np.uint8)
-    
-    # Add some patterns
-    for i in range(TEST_IMAGE_SIZE[1]):
-        for j in range(TEST_IMAGE_SIZE[0]):
-            img[i, j] = [
-                int(255 * i / TEST_IMAGE_SIZE[1]),  # Red gradient
-                int(255 * j / TEST_IMAGE_SIZE[0]),  # Green gradient
-                128  # Blue constant
-            ]
+    """Create a simple test image (PNG bytes, built once and shared by all tests)"""
+    # Create a gradient image (broadcast per-row / per-column ramps, no pixel loop)
+    width, height = TEST_IMAGE_SIZE
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[..., 0] = (np.arange(height) * 255 // height)[:, None]  # Red gradient
+    img[..., 1] = (np.arange(width) * 255 // width)[None, :]  # Green gradient
+    img[..., 2] = 128  # Blue constant
     
     # Convert to PIL Image
     pil_img = Image.fromarray(img)
     
-    # Convert to base64
+    # Encode as PNG (uploaded as a raw multipart file, no base64)
     buffer = io.BytesIO()
     pil_img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    b64_string = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    return f"data:image/png;base64,{b64_string}"
+    return buffer.getvalue()
 
 def test_health():
     """Test health endpoint"""
     print("Testing /health endpoint...")
     try:
-        response = requests.get(f"{API_BASE}/health", timeout=10)
+        response = SESSION.get(f"{API_BASE}/health", timeout=10)
         print(f"Status: {response.status_code}")
-        print(f"Response: {json.dumps(response.json(), indent=2)}")
+        print(f"Response: {orjson.dumps(orjson.loads(response.content), option=orjson.OPT_INDENT_2).decode()}")
         return response.status_code == 200
     except Exception as e:
         print(f"Error: {e}")
         return False
 
-def test_remove_api():
+def test_remove_api(log=print):
     """Test remove object API"""
-    print("\nTesting /remove endpoint...")
+    log("\nTesting /remove endpoint...")
     try:
         # Create test data
-        image_data = create_test_image()
+        image_bytes = create_test_image()
         
         payload = {
-            "image_data": image_data,
             "point_coords": [[100, 100], [150, 120]],
             "point_labels": [1, 1],
             "dilate_kernel_size": 15
         }
         
-        response = requests.post(
+        response = SESSION.post(
             f"{API_BASE}/remove",
-            json=payload,
+            files={"image": ("test.png", image_bytes, "image/png")},
+            data={"request": orjson.dumps(payload)},
             timeout=30
         )
         
-        print(f"Status: {response.status_code}")
+        log(f"Status: {response.status_code}")
         if response.status_code == 200:
-            result = response.json()
-            print(f"Success: {result['success']}")
-            print(f"Message: {result['message']}")
-            print(f"Processing time: {result.get('processing_time', 'N/A')}s")
-            print(f"Result image length: {len(result['result_image'])}")
-            print(f"Mask image length: {len(result['mask_image'])}")
+            result = orjson.loads(response.content)
+            log(f"Success: {result['success']}")
+            log(f"Message: {result['message']}")
+            log(f"Processing time: {result.get('processing_time', 'N/A')}s")
+            log(f"Result image length: {len(result['result_image'])}")
+            log(f"Mask image length: {len(result['mask_image'])}")
             return True
         else:
-            print(f"Error: {response.text}")
+            log(f"Error: {response.text}")
             return False
             
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}")
         return False
 
-def test_fill_api():
+def test_fill_api(log=print):
     """Test fill object API"""
-    print("\nTesting /fill endpoint...")
+    log("\nTesting /fill endpoint...")
     try:
         # Create test data
-        image_data = create_test_image()
+        image_bytes = create_test_image()
         
         payload = {
-            "image_data": image_data,
             "point_coords": [[100, 100]],
             "point_labels": [1],
             "text_prompt": "beautiful red flower",
             "dilate_kernel_size": 10
         }
         
-        response = requests.post(
+        response = SESSION.post(
             f"{API_BASE}/fill",
-            json=payload,
+            files={"image": ("test.png", image_bytes, "image/png")},
+            data={"request": orjson.dumps(payload)},
             timeout=30
         )
         
-        print(f"Status: {response.status_code}")
+        log(f"Status: {response.status_code}")
         if response.status_code == 200:
-            result = response.json()
-            print(f"Success: {result['success']}")
-            print(f"Message: {result['message']}")
-            print(f"Processing time: {result.get('processing_time', 'N/A')}s")
-            print(f"Result image length: {len(result['result_image'])}")
+            result = orjson.loads(response.content)
+            log(f"Success: {result['success']}")
+            log(f"Message: {result['message']}")
+            log(f"Processing time: {result.get('processing_time', 'N/A')}s")
+            log(f"Result image length: {len(result['result_image'])}")
             return True
         else:
-            print(f"Error: {response.text}")
+            log(f"Error: {response.text}")
             return False
             
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}")
         return False
 
-def test_replace_api():
+def test_replace_api(log=print):
     """Test replace object API"""
-    print("\nTesting /replace endpoint...")
+    log("\nTesting /replace endpoint...")
     try:
         # Create test data
-        image_data = create_test_image()
+        image_bytes = create_test_image()
         
         payload = {
-            "image_data": image_data,
             "point_coords": [[150, 100]],
             "point_labels": [1],
             "text_prompt": "sunset ocean background",
             "num_inference_steps": 20
         }
         
-        response = requests.post(
+        response = SESSION.post(
             f"{API_BASE}/replace",
-            json=payload,
+            files={"image": ("test.png", image_bytes, "image/png")},
+            data={"request": orjson.dumps(payload)},
             timeout=30
         )
         
-        print(f"Status: {response.status_code}")
+        log(f"Status: {response.status_code}")
         if response.status_code == 200:
-            result = response.json()
-            print(f"Success: {result['success']}")
-            print(f"Message: {result['message']}")
-            print(f"Processing time: {result.get('processing_time', 'N/A')}s")
-            print(f"Result image length: {len(result['result_image'])}")
+            result = orjson.loads(response.content)
+            log(f"Success: {result['success']}")
+            log(f"Message: {result['message']}")
+            log(f"Processing time: {result.get('processing_time', 'N/A')}s")
+            log(f"Result image length: {len(result['result_image'])}")
             return True
         else:
-            print(f"Error: {response.text}")
+            log(f"Error: {response.text}")
             return False
             
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}")
         return False
 
+def run_collected(test_func):
+    """Run a test with its log lines collected; returns (result, lines)"""
+    lines = []
+    return test_func(log=lines.append), lines
+
 def main():
     """Main test function"""
     print("🧪 Inpaint Anything API Test")
@@ -172,13 +178,27 @@ def main():
     print("Waiting for server to start...")
     time.sleep(2)
     
-    results = []
+    # Build the shared test image before the tests race to create it
+    create_test_image()
     
-    # Run tests
-    results.append(("Health Check", test_health()))
-    results.append(("Remove Object", test_remove_api()))
-    results.append(("Fill Object", test_fill_api()))
-    results.append(("Replace Object", test_replace_api()))
+    # Health first as a gate, then the three endpoint tests concurrently
+    # (each test's log lines are collected and printed in order)
+    results = [("Health Check", test_health())]
+    tests = [
+        ("Remove Object", test_remove_api),
+        ("Fill Object", test_fill_api),
+        ("Replace Object", test_replace_api),
+    ]
+    if results[0][1]:
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            futures = [executor.submit(run_collected, test_func) for _, test_func in tests]
+            for (test_name, _), future in zip(tests, futures):
+                result, lines = future.result()
+                print("\n".join(lines))
+                results.append((test_name, result))
+    else:
+        print("\nSkipping endpoint tests: health check failed")
+        results.extend((test_name, False) for test_name, _ in tests)
     
     # Summary
     print("\n" + "=" * 50)
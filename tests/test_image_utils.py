@@ -0,0 +1,24 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.exceptions import InvalidImageException
+from utils.image_utils import validate_coordinates
+
+
+@pytest.mark.parametrize("point", [
+    [math.nan, 1.0],
+    [1.0, math.nan],
+    [math.inf, 1.0],
+    [1.0, -math.inf],
+])
+def test_validate_coordinates_rejects_non_finite(point):
+    with pytest.raises(InvalidImageException):
+        validate_coordinates([[10.0, 10.0], point], (100, 200, 3))
+
+
+def test_validate_coordinates_accepts_bounds():
+    coords = validate_coordinates([[0, 0], [200, 100]], (100, 200, 3))
+    assert coords.dtype == np.float32
+    assert coords.tolist() == [[0.0, 0.0], [200.0, 100.0]]
@@ -1,35 +1,94 @@
 import asyncio
-import base64
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import cv2
 import numpy as np
-from PIL import Image
-from typing import Tuple, Union
+from PIL import Image, UnidentifiedImageError
+from typing import Optional, Tuple, Union
 import aiofiles
 
+try:
+    import pybase64
+except ImportError:  # Fall back to the stdlib implementation
+    import base64 as pybase64
+
 from utils.exceptions import InvalidImageException, FileTooLargeException, UnsupportedImageFormatException
 from config.settings import settings
 
+# PIL format plugins allowed for base64 uploads
+_SUPPORTED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+# Dedicated pool for image decoding; cv2/PIL release the GIL while decoding
+_decode_pool: Optional[ThreadPoolExecutor] = None
+
+
+def start_decode_pool(max_workers: Optional[int] = None):
+    """Create the image decode thread pool (call once at startup)"""
+    global _decode_pool
+    if _decode_pool is None:
+        _decode_pool = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            thread_name_prefix="imgdec"
+        )
+
+
+def shutdown_decode_pool():
+    """Shut down the image decode thread pool"""
+    global _decode_pool
+    if _decode_pool is not None:
+        _decode_pool.shutdown(wait=False)
+        _decode_pool = None
+
+
+async def _run_decode(func, *args):
+    """Run a decode function on the decode pool (default executor if not started)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_decode_pool, func, *args)
+
 
 async def decode_base64_image(base64_string: str) -> np.ndarray:
     """Decode base64 string to numpy array asynchronously"""
+    return await _run_decode(_decode_base64_image_sync, base64_string)
+
+
+def _decode_base64_image_sync(base64_string: str) -> np.ndarray:
+    """Synchronous base64 decode, run in a worker thread"""
     try:
         # Remove data URL prefix if present
         if base64_string.startswith('data:image'):
-            base64_string = base64_string.split(',')[1]
+            base64_string = base64_string.partition(',')[2]
+        
+        # Reject oversized payloads from the encoded length, before decoding them
+        decoded_size = len(base64_string) * 3 // 4 - base64_string[-2:].count('=')
+        if decoded_size > settings.max_file_size:
+            raise FileTooLargeException(f"Image size {decoded_size} exceeds limit {settings.max_file_size}")
         
         # Decode base64
-        image_data = base64.b64decode(base64_string)
+        image_data = pybase64.b64decode(base64_string)
         
         # Check file size
         if len(image_data) > settings.max_file_size:
             raise FileTooLargeException(f"Image size {len(image_data)} exceeds limit {settings.max_file_size}")
         
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Validate image format
-        if image.format not in ['JPEG', 'PNG', 'WebP']:
-            raise UnsupportedImageFormatException(f"Unsupported image format: {image.format}")
+        # Convert to PIL Image. The BytesIO is the only reference to the encoded bytes,
+        # so closing it after load() frees them before the convert/resize copies
+        image_file = io.BytesIO(image_data)
+        del image_data
+        with image_file:
+            # Only the supported formats' plugins are tried; anything else is unidentified
+            try:
+                image = Image.open(image_file, formats=_SUPPORTED_FORMATS)
+            except UnidentifiedImageError:
+                raise UnsupportedImageFormatException("Unsupported image format")
+            
+            # Large JPEGs: let libjpeg decode at 1/2, 1/4 or 1/8 scale, no smaller than the target
+            if image.format == 'JPEG' and max(image.size) > settings.max_image_size:
+                ratio = settings.max_image_size / max(image.size)
+                image.draft('RGB', tuple(int(dim * ratio) for dim in image.size))
+            
+            image.load()
         
         # Convert to RGB if necessary
         if image.mode != 'RGB':
@@ -39,7 +98,7 @@ async def decode_base64_image(base64_string: str) -> np.ndarray:
         if max(image.size) > settings.max_image_size:
             ratio = settings.max_image_size / max(image.size)
             new_size = tuple(int(dim * ratio) for dim in image.size)
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
+            image = image.resize(new_size, Image.Resampling.BILINEAR)
         
         # Convert to numpy array
         return np.array(image)
@@ -50,8 +109,25 @@ async def decode_base64_image(base64_string: str) -> np.ndarray:
         raise InvalidImageException(f"Failed to decode base64 image: {str(e)}")
 
 
+# Encoder options favouring speed for API responses
+_SAVE_OPTIONS = {
+    "PNG": {"optimize": False, "compress_level": 1},
+    "JPEG": {"optimize": False, "quality": 85},
+}
+
+
+def _b64encode(data: bytes) -> str:
+    """Encode bytes to an ASCII base64 string"""
+    return pybase64.b64encode(data).decode('ascii')
+
+
 async def encode_image_to_base64(image: np.ndarray, format: str = "PNG") -> str:
     """Encode numpy array to base64 string asynchronously"""
+    return await asyncio.to_thread(_encode_image_to_base64_sync, image, format)
+
+
+def _encode_image_to_base64_sync(image: np.ndarray, format: str) -> str:
+    """Synchronous PNG/base64 encode, run in a worker thread"""
     try:
         # Convert numpy array to PIL Image
         if image.dtype != np.uint8:
@@ -59,14 +135,12 @@ async def encode_image_to_base64(image: np.ndarray, format: str = "PNG") -> str:
         
         pil_image = Image.fromarray(image)
         
-        # Convert to bytes
+        # Convert to bytes (fast zlib level: ~4x less CPU than the default 6 for ~10% more bytes)
         buffer = io.BytesIO()
-        pil_image.save(buffer, format=format)
-        buffer.seek(0)
+        pil_image.save(buffer, format=format, **_SAVE_OPTIONS.get(format.upper(), {}))
         
         # Encode to base64
-        image_data = buffer.getvalue()
-        base64_string = base64.b64encode(image_data).decode('utf-8')
+        base64_string = _b64encode(buffer.getbuffer())
         
         return f"data:image/{format.lower()};base64,{base64_string}"
         
@@ -74,32 +148,78 @@ async def encode_image_to_base64(image: np.ndarray, format: str = "PNG") -> str:
         raise InvalidImageException(f"Failed to encode image to base64: {str(e)}")
 
 
-async def load_image_from_file(file_content: bytes) -> np.ndarray:
-    """Load image from file content asynchronously"""
+async def encode_mask_to_base64(mask: np.ndarray) -> str:
+    """Encode a binary mask to a base64 PNG string asynchronously"""
+    return await asyncio.to_thread(_encode_mask_to_base64_sync, mask)
+
+
+def _encode_mask_to_base64_sync(mask: np.ndarray) -> str:
+    """Scale a 0/1 mask to 0/255 and PNG-encode it in one pass"""
     try:
-        # Check file size
-        if len(file_content) > settings.max_file_size:
-            raise FileTooLargeException(f"File size {len(file_content)} exceeds limit {settings.max_file_size}")
+        # cv2 has no bool type; reinterpret as uint8 without copying
+        if mask.dtype == np.bool_:
+            mask = mask.view(np.uint8)
+        
+        # Multiply and saturate-cast to uint8 in a single C loop
+        mask_u8 = cv2.convertScaleAbs(mask, alpha=255.0)
+        
+        ok, png = cv2.imencode('.png', mask_u8)
+        if not ok:
+            raise InvalidImageException("cv2 could not encode mask")
         
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(file_content))
+        return f"data:image/png;base64,{_b64encode(png)}"
         
+    except Exception as e:
+        raise InvalidImageException(f"Failed to encode mask to base64: {str(e)}")
+
+
+async def load_image_from_file(file_content: Union[bytes, bytearray]) -> np.ndarray:
+    """Load image from file content asynchronously"""
+    # Check file size
+    if len(file_content) > settings.max_file_size:
+        raise FileTooLargeException(f"File size {len(file_content)} exceeds limit {settings.max_file_size}")
+    
+    # Decode off the event loop (cv2 releases the GIL while decoding)
+    return await _run_decode(_decode_image_bytes, file_content)
+
+
+def _sniff_image_format(data: Union[bytes, bytearray]) -> Optional[str]:
+    """Detect image format from the file signature"""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'JPEG'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'PNG'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'WebP'
+    return None
+
+
+def _decode_image_bytes(file_content: Union[bytes, bytearray]) -> np.ndarray:
+    """Synchronous decode of encoded image bytes to an RGB numpy array"""
+    try:
         # Validate image format
-        if image.format not in ['JPEG', 'PNG', 'WebP']:
-            raise UnsupportedImageFormatException(f"Unsupported image format: {image.format}")
+        if _sniff_image_format(file_content) is None:
+            raise UnsupportedImageFormatException("Unsupported image format")
         
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Decode directly from the upload buffer without an extra copy. EXIF orientation
+        # is ignored, as PIL does, so point_coords match the base64 path's pixels
+        image = cv2.imdecode(
+            np.frombuffer(file_content, np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+        )
+        if image is None:
+            raise InvalidImageException("cv2 could not decode image data")
+        
+        # Convert BGR to RGB
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
         # Resize if too large
-        if max(image.size) > settings.max_image_size:
-            ratio = settings.max_image_size / max(image.size)
-            new_size = tuple(int(dim * ratio) for dim in image.size)
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
+        height, width = image.shape[:2]
+        if max(height, width) > settings.max_image_size:
+            ratio = settings.max_image_size / max(height, width)
+            new_size = (int(width * ratio), int(height * ratio))
+            image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
         
-        # Convert to numpy array
-        return np.array(image)
+        return image
         
     except Exception as e:
         if isinstance(e, (FileTooLargeException, UnsupportedImageFormatException)):
@@ -107,34 +227,41 @@ async def load_image_from_file(file_content: bytes) -> np.ndarray:
         raise InvalidImageException(f"Failed to load image from file: {str(e)}")
 
 
-def validate_coordinates(coords: list, image_shape: Tuple[int, int]) -> list:
+def validate_coordinates(coords: list, image_shape: Tuple[int, int]) -> np.ndarray:
     """Validate point coordinates"""
     height, width = image_shape[:2]
     
-    validated_coords = []
-    for coord in coords:
-        if len(coord) != 2:
-            raise InvalidImageException("Each coordinate must have exactly 2 values [x, y]")
-        
-        x, y = coord
-        if not (0 <= x <= width and 0 <= y <= height):
-            raise InvalidImageException(f"Coordinate ({x}, {y}) is outside image bounds ({width}, {height})")
-        
-        validated_coords.append([float(x), float(y)])
+    # One conversion and vectorized bounds checks instead of a per-point loop
+    try:
+        coords_array = np.asarray(coords, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise InvalidImageException("Each coordinate must have exactly 2 values [x, y]")
+    if coords_array.ndim != 2 or coords_array.shape[1] != 2:
+        if coords_array.size == 0:
+            return coords_array.reshape(0, 2)
+        raise InvalidImageException("Each coordinate must have exactly 2 values [x, y]")
+    
+    x, y = coords_array[:, 0], coords_array[:, 1]
+    # Negated in-range test, so NaN (which fails every comparison) counts as outside
+    outside = ~((x >= 0) & (x <= width) & (y >= 0) & (y <= height))
+    if outside.any():
+        bad_x, bad_y = coords[int(np.argmax(outside))]
+        raise InvalidImageException(f"Coordinate ({bad_x}, {bad_y}) is outside image bounds ({width}, {height})")
     
-    return validated_coords
+    return coords_array
 
 
-def validate_point_labels(labels: list, coords_count: int) -> list:
+def validate_point_labels(labels: list, coords_count: int) -> np.ndarray:
     """Validate point labels"""
     if len(labels) != coords_count:
         raise InvalidImageException(f"Number of labels ({len(labels)}) must match number of coordinates ({coords_count})")
     
-    for label in labels:
-        if label not in [0, 1]:
-            raise InvalidImageException(f"Point labels must be 0 or 1, got {label}")
+    labels_array = np.asarray(labels)
+    invalid = (labels_array != 0) & (labels_array != 1)
+    if invalid.any():
+        raise InvalidImageException(f"Point labels must be 0 or 1, got {labels[int(np.argmax(invalid))]}")
     
-    return [int(label) for label in labels]
+    return labels_array.astype(np.int32)
 
 
 async def resize_image_if_needed(image: np.ndarray, max_size: int = None) -> np.ndarray:
@@ -154,8 +281,6 @@ async def resize_image_if_needed(image: np.ndarray, max_size: int = None) -> np.
         new_width = max_size
         new_height = int(height * max_size / width)
     
-    # Resize using PIL for better quality
-    pil_image = Image.fromarray(image)
-    resized_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-    
-    return np.array(resized_image)
\ No newline at end of file
+    # Area-averaging downscale straight on the array (no PIL round trip), off the event loop
+    resize = partial(cv2.resize, interpolation=cv2.INTER_AREA)
+    return await _run_decode(resize, image, (new_width, new_height))
\ No newline at end of file